@@ -168,7 +168,8 @@ SETUP_REQUIRES = [
 ]
 INSTALL_REQUIRES = [
     'PySide >= 1.2.2, < 2',
-    'clique >= 1.2.0, < 2'
+    'clique >= 1.2.0, < 2',
+    'scandir >= 1.5, < 2; python_version < "3.5"'
 ]
 TEST_REQUIRES = [
     'pytest >= 2.3.5, < 3'
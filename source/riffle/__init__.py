@@ -2,4 +2,31 @@
 # :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
 # :license: See LICENSE.txt.
 
+import importlib
+
 from ._version import __version__
+
+
+#: Submodules imported on first access as attributes of the package, so that
+#: importing :py:mod:`riffle` alone does not import Qt.
+SUBMODULES = (
+    'aggregate', 'aio', 'browser', 'cache', 'core', 'icon_factory', 'model',
+    'mount', 'prefetch', 'search', 'watcher'
+)
+
+
+def __getattr__(name):
+    '''Return submodule *name*, importing it if necessary.
+
+    .. note::
+
+        Only called on Python 3.7 and later. On earlier versions submodules
+        must be imported explicitly.
+
+    '''
+    if name in SUBMODULES:
+        return importlib.import_module('{0}.{1}'.format(__name__, name))
+
+    raise AttributeError(
+        'module {0!r} has no attribute {1!r}'.format(__name__, name)
+    )
@@ -0,0 +1,189 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import threading
+
+from PySide import QtCore
+
+# Aggregation is implemented without Qt in riffle.core and provided here for
+# convenience and compatibility.
+from riffle.core import Aggregate, aggregate, combine
+
+
+class _AggregateSignals(QtCore.QObject):
+    '''Signals emitted by an :py:class:`_AggregateJob`.'''
+
+    #: Emitted with job and aggregate (None if cancelled or failed).
+    finished = QtCore.Signal(object, object)
+
+
+class _AggregateJob(QtCore.QRunnable):
+    '''Compute aggregate for a directory on a worker thread.'''
+
+    def __init__(self, path, cache):
+        '''Initialise job for directory *path* using shared *cache*.'''
+        super(_AggregateJob, self).__init__()
+        self.setAutoDelete(False)
+
+        self.path = path
+        self.cache = cache
+        self.cancelled = False
+        self.signals = _AggregateSignals()
+
+    def run(self):
+        '''Run job.'''
+        result = None
+        try:
+            result = aggregate(
+                self.path, cache=self.cache,
+                cancelled=lambda: self.cancelled
+            )
+        except OSError:
+            pass
+
+        self.signals.finished.emit(self, result)
+
+
+class _Cache(object):
+    '''Thread safe mapping of directory path to aggregate.'''
+
+    def __init__(self):
+        '''Initialise empty cache.'''
+        super(_Cache, self).__init__()
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, path):
+        '''Return aggregate for *path* or None if not cached.'''
+        with self._lock:
+            return self._data.get(path)
+
+    def __setitem__(self, path, value):
+        '''Set aggregate for *path* to *value*.'''
+        with self._lock:
+            self._data[path] = value
+
+    def discard(self, path):
+        '''Remove *path* and its ancestors from cache.'''
+        with self._lock:
+            while True:
+                self._data.pop(path, None)
+
+                head = os.path.dirname(path)
+                if not head or head == path:
+                    break
+
+                path = head
+
+    def clear(self):
+        '''Remove all entries.'''
+        with self._lock:
+            self._data.clear()
+
+
+class AggregateService(QtCore.QObject):
+    '''Compute directory aggregates in the background.
+
+    Results are cached per directory (including every subdirectory walked)
+    until invalidated. Invalidating a directory also invalidates its
+    ancestors, but not its descendants, so recomputation after a change only
+    walks the directories affected.
+
+    '''
+
+    #: Emitted with path and :py:class:`Aggregate` when computed.
+    ready = QtCore.Signal(object, object)
+
+    def __init__(self, parent=None, maximumThreadCount=2):
+        '''Initialise service.
+
+        *parent* is the optional owner of the service.
+
+        *maximumThreadCount* limits the number of directories aggregated
+        concurrently.
+
+        '''
+        super(AggregateService, self).__init__(parent=parent)
+        self._cache = _Cache()
+        self._jobs = {}
+        self._cancelledJobs = set()
+
+        self._threadPool = QtCore.QThreadPool(self)
+        self._threadPool.setMaxThreadCount(maximumThreadCount)
+
+    def get(self, path):
+        '''Return cached aggregate for *path* or None if not available.'''
+        return self._cache.get(path)
+
+    def request(self, path):
+        '''Return aggregate for *path*, computing it if not cached.
+
+        If not cached, None is returned and :py:attr:`ready` emitted once the
+        aggregate has been computed in the background.
+
+        '''
+        result = self._cache.get(path)
+        if result is not None:
+            return result
+
+        if path not in self._jobs:
+            job = _AggregateJob(path, self._cache)
+            job.signals.finished.connect(self._onJobFinished)
+            self._jobs[path] = job
+            self._threadPool.start(job)
+
+        return None
+
+    def isPending(self, path):
+        '''Return whether aggregate for *path* is being computed.'''
+        return path in self._jobs
+
+    def cancel(self, path):
+        '''Cancel pending computation for *path*.'''
+        job = self._jobs.pop(path, None)
+        if job is not None:
+            job.cancelled = True
+
+            # Keep reference until job completes on its thread.
+            self._cancelledJobs.add(job)
+
+    def cancelAll(self):
+        '''Cancel all pending computations.'''
+        for path in list(self._jobs.keys()):
+            self.cancel(path)
+
+    def invalidate(self, path):
+        '''Discard cached aggregate for *path* and its ancestors.
+
+        Any pending computation of an affected path is restarted so that it
+        does not produce a stale result.
+
+        '''
+        self._cache.discard(path)
+
+        for pendingPath in list(self._jobs.keys()):
+            if pendingPath == path or path.startswith(
+                pendingPath.rstrip(os.sep) + os.sep
+            ):
+                self.cancel(pendingPath)
+                self.request(pendingPath)
+
+    def clear(self):
+        '''Cancel pending computations and discard all cached aggregates.'''
+        self.cancelAll()
+        self._cache.clear()
+
+    def _onJobFinished(self, job, result):
+        '''Handle completion of *job* with *result*.'''
+        self._cancelledJobs.discard(job)
+
+        if self._jobs.get(job.path) is not job:
+            # Cancelled.
+            return
+
+        del self._jobs[job.path]
+
+        if result is not None:
+            self.ready.emit(job.path, result)
@@ -0,0 +1,181 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''List directories from :py:mod:`asyncio` applications.
+
+.. note::
+
+    Requires Python 3.6 or later.
+
+'''
+
+import os
+import asyncio
+import functools
+import itertools
+
+import riffle.core
+
+
+class Lister(object):
+    '''List directories without blocking an event loop.
+
+    Filesystem calls run on an executor and at most a fixed number run at
+    once, so that a single event loop can serve many concurrent requests::
+
+        lister = riffle.aio.Lister(concurrency=16)
+
+        async for item in lister.children('/path/to/render'):
+            print(item.path, item.size)
+
+    Items are :py:class:`riffle.core.Item` instances with collections
+    grouped, as listed by :py:class:`riffle.model.Filesystem`. A lister
+    should only be used from a single event loop.
+
+    '''
+
+    def __init__(self, executor=None, concurrency=8, batchSize=500):
+        '''Initialise lister.
+
+        *executor* is the :py:class:`concurrent.futures.Executor` to run
+        filesystem calls on. If not specified, the default executor of the
+        event loop is used.
+
+        *concurrency* is the maximum number of filesystem calls running at
+        once across all requests made through this lister.
+
+        *batchSize* is the number of children listed per call when iterating
+        over children. Smaller batches yield the first children sooner and
+        share the executor more fairly between requests.
+
+        '''
+        super(Lister, self).__init__()
+        self.executor = executor
+        self.concurrency = concurrency
+        self.batchSize = batchSize
+
+        # Created on first use so that it belongs to the running loop.
+        self._semaphore = None
+
+        # Individual reads and writes of a dictionary are atomic, so it is
+        # safe to share between aggregations on different executor threads.
+        self._aggregateCache = {}
+
+    async def _run(self, function, *args):
+        '''Return result of calling *function* with *args* on executor.'''
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self._semaphore:
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor, functools.partial(function, *args)
+            )
+
+    async def item(self, path):
+        '''Return :py:class:`riffle.core.Item` for *path*.
+
+        Raise :py:exc:`ValueError` if *path* cannot be represented.
+
+        '''
+        return await self._run(riffle.core.ItemFactory, path)
+
+    async def _resolve(self, item):
+        '''Return *item* or item for *item* if it is a path.'''
+        if isinstance(item, riffle.core.Item):
+            return item
+
+        return await self.item(item)
+
+    async def children(self, item):
+        '''Yield children of *item* as they are listed.
+
+        *item* may be a :py:class:`riffle.core.Item` or a path. Children are
+        returned unparented and *item* is left unchanged, so it may be listed
+        again. Entries that can be part of a collection are grouped and
+        yielded once the listing is complete.
+
+        '''
+        item = await self._resolve(item)
+        iterator = await self._run(item._iterChildren)
+        pending = None
+
+        try:
+            while True:
+                # Shielded so that cancelling the caller does not abandon a
+                # batch still being listed on the executor.
+                pending = asyncio.ensure_future(
+                    self._run(list, itertools.islice(iterator, self.batchSize))
+                )
+                batch = await asyncio.shield(pending)
+
+                for child in batch:
+                    yield child
+
+                if len(batch) < self.batchSize:
+                    break
+
+        finally:
+            # The iterator cannot be closed whilst a batch is still advancing
+            # it on the executor, so wait for that batch first.
+            if pending is not None and not pending.done():
+                await asyncio.wait([pending])
+
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    async def stat(self, item):
+        '''Return :py:class:`riffle.core.Stat` for *item*.
+
+        *item* may be a :py:class:`riffle.core.Item` or a path. Items listed
+        from a directory already hold their stat information and are
+        returned without querying the filesystem.
+
+        Raise :py:exc:`OSError` if *item* has no single filesystem entry,
+        such as a collection.
+
+        '''
+        item = await self._resolve(item)
+        return await self._run(item.stat)
+
+    async def aggregate(self, item):
+        '''Return :py:class:`riffle.core.Aggregate` for *item*.
+
+        *item* may be a :py:class:`riffle.core.Item` or a path. Directories
+        are walked in the manner of ``du -x`` and the result set on the item.
+        Walked directories are cached until :py:meth:`invalidate` is called,
+        so aggregating a directory after one of its subdirectories is cheap.
+
+        Return None for items that cannot be aggregated, such as the
+        computer.
+
+        '''
+        item = await self._resolve(item)
+
+        if item.aggregate is not None:
+            return item.aggregate
+
+        if isinstance(item, riffle.core.Directory):
+            item.aggregate = await self._run(
+                riffle.core.aggregate, item.path, self._aggregateCache
+            )
+
+        elif isinstance(item, riffle.core.File):
+            stat = await self._run(item.stat)
+            item.aggregate = riffle.core.Aggregate(
+                stat.size, 1, stat.modified
+            )
+
+        return item.aggregate
+
+    def invalidate(self, path):
+        '''Discard cached aggregates for *path* and its ancestors.'''
+        while True:
+            self._aggregateCache.pop(path, None)
+
+            head = os.path.dirname(path)
+            if not head or head == path:
+                break
+
+            path = head
@@ -6,15 +6,16 @@ import os
 
 from PySide import QtGui, QtCore
 
-import riffle.resource
-import riffle.model
-import riffle.icon_factory
+import riffle
 
 
 class FilesystemBrowser(QtGui.QDialog):
     '''FilesystemBrowser dialog.'''
 
-    def __init__(self, root='', parent=None, iconFactory=None):
+    def __init__(
+        self, root='', parent=None, iconFactory=None, asynchronous=False,
+        watch=False, aggregateDirectories=False, cache=None, prefetch=False
+    ):
         '''Initialise browser with *root* path.
 
         Use an empty *root* path to specify the computer.
@@ -24,16 +25,46 @@ class FilesystemBrowser(QtGui.QDialog):
         *iconFactory* specifies the optional factory to pass to the model for
         customising icons.
 
+        If *asynchronous* is True then directory contents are listed in the
+        background, keeping the browser responsive whilst large or slow
+        directories load.
+
+        If *watch* is True then displayed directories are watched and the
+        browser updated as their contents change.
+
+        If *aggregateDirectories* is True then directories display the total
+        size and latest modified date of all files under them, computed in the
+        background.
+
+        *cache* may be a :py:class:`riffle.cache.ListingCache` used to display
+        the last known contents of directories immediately whilst they are
+        revalidated in the background.
+
+        If *prefetch* is True then directories near the selection are listed
+        in the background at low priority so that opening them is immediate.
+
         '''
         super(FilesystemBrowser, self).__init__(parent=parent)
         self._root = root
         self._iconFactory = iconFactory
+        self._asynchronous = asynchronous
+        self._watch = watch
+        self._aggregateDirectories = aggregateDirectories
+        self._cache = cache
+        self._prefetch = prefetch
+        self._location = None
         self._selected = []
         self._construct()
         self._postConstruction()
 
     def _construct(self):
         '''Construct widget.'''
+        # Imported on construction rather than with this module so that
+        # loading an application that may show a browser, such as a plugin,
+        # does not import the model and its dependencies until needed.
+        import riffle.model
+        import riffle.icon_factory
+
         self.setLayout(QtGui.QVBoxLayout())
 
         self._headerLayout = QtGui.QHBoxLayout()
@@ -42,9 +73,14 @@ class FilesystemBrowser(QtGui.QDialog):
         self._headerLayout.addWidget(self._locationWidget, stretch=1)
 
         self._upButton = QtGui.QToolButton()
+        riffle.icon_factory.registerResources()
         self._upButton.setIcon(QtGui.QIcon(':riffle/icon/up'))
         self._headerLayout.addWidget(self._upButton)
 
+        self._filterWidget = QtGui.QLineEdit()
+        self._filterWidget.setPlaceholderText('Filter')
+        self._headerLayout.addWidget(self._filterWidget)
+
         self.layout().addLayout(self._headerLayout)
 
         self._contentSplitter = QtGui.QSplitter()
@@ -65,7 +101,10 @@ class FilesystemBrowser(QtGui.QDialog):
 
         proxy = riffle.model.FilesystemSortProxy(self)
         model = riffle.model.Filesystem(
-            path=self._root, parent=self, iconFactory=self._iconFactory
+            path=self._root, parent=self, iconFactory=self._iconFactory,
+            asynchronous=self._asynchronous, watch=self._watch,
+            aggregateDirectories=self._aggregateDirectories,
+            cache=self._cache
         )
         proxy.setSourceModel(model)
         proxy.setDynamicSortFilter(True)
@@ -73,10 +112,21 @@ class FilesystemBrowser(QtGui.QDialog):
         self._filesystemWidget.setModel(proxy)
         self._filesystemWidget.setSortingEnabled(True)
 
+        self._prefetchScheduler = None
+        if self._prefetch:
+            import riffle.prefetch
+            self._prefetchScheduler = riffle.prefetch.PrefetchScheduler(
+                proxy, parent=self
+            )
+
         self._contentSplitter.setStretchFactor(1, 1)
         self.layout().addWidget(self._contentSplitter)
 
         self._footerLayout = QtGui.QHBoxLayout()
+
+        self._statusLabel = QtGui.QLabel()
+        self._footerLayout.addWidget(self._statusLabel)
+
         self._footerLayout.addStretch(1)
 
         self._cancelButton = QtGui.QPushButton('Cancel')
@@ -117,10 +167,16 @@ class FilesystemBrowser(QtGui.QDialog):
             self._onNavigate
         )
 
+        self._filterWidget.textChanged.connect(self._onFilterChanged)
+
         self._filesystemWidget.activated.connect(self._onActivateItem)
         selectionModel = self._filesystemWidget.selectionModel()
         selectionModel.currentRowChanged.connect(self._onSelectItem)
 
+        model = self._filesystemWidget.model().sourceModel()
+        model.loadingChanged.connect(self._onLoadingChanged)
+        model.fetchFailed.connect(self._onFetchFailed)
+
     def _configureShortcuts(self):
         '''Add keyboard shortcuts to navigate the filesystem.'''
         self._upShortcut = QtGui.QShortcut(
@@ -129,6 +185,12 @@ class FilesystemBrowser(QtGui.QDialog):
         self._upShortcut.setAutoRepeat(False)
         self._upShortcut.activated.connect(self._onNavigateUpButtonClicked)
 
+        self._refreshShortcut = QtGui.QShortcut(
+            QtGui.QKeySequence(QtGui.QKeySequence.Refresh), self
+        )
+        self._refreshShortcut.setAutoRepeat(False)
+        self._refreshShortcut.activated.connect(self.refresh)
+
     def _onActivateItem(self, index):
         '''Handle activation of item in listing.'''
         item = self._filesystemWidget.model().item(index)
@@ -143,6 +205,51 @@ class FilesystemBrowser(QtGui.QDialog):
         item = self._filesystemWidget.model().item(selection)
         self._selected.append(item.path)
 
+        if self._prefetchScheduler is not None:
+            self._prefetchScheduler.schedule(selection)
+
+    def _onLoadingChanged(self, item, loading):
+        '''Handle change in *loading* state of *item*.'''
+        if item.path == self._location:
+            if loading:
+                self._statusLabel.setText('Loading...')
+            else:
+                self._statusLabel.clear()
+
+    def _onFetchFailed(self, item, error):
+        '''Handle failure to list children of *item*.'''
+        if item.path == self._location:
+            self._statusLabel.setText(
+                '{0} is not accessible.'.format(item.path or item.name)
+            )
+
+    def _onFilterChanged(self, text):
+        '''Handle change of filter *text*.'''
+        self._applyFilter()
+
+    def _applyFilter(self, path=None):
+        '''Filter location at *path* by the entered pattern.
+
+        If *path* is not specified, filter the current location. A pattern
+        without wildcards matches any name containing it.
+
+        '''
+        if path is None:
+            path = self._location
+
+        model = self._filesystemWidget.model()
+        pattern = self._filterWidget.text()
+
+        if not pattern:
+            model.clearFilter()
+            return
+
+        if not any(character in pattern for character in '*?['):
+            pattern = '*{0}*'.format(pattern)
+
+        # Only filter the location so that it and its ancestors remain.
+        model.setFilter(pattern=pattern, path=path)
+
     def _onNavigate(self, index):
         '''Handle selection of path segment.'''
         if index > 0:
@@ -226,13 +333,33 @@ class FilesystemBrowser(QtGui.QDialog):
         if not path.startswith(model.root.path):
             raise ValueError('Location must be root or under root.')
 
-        # Ensure children for each segment in path are loaded.
+        # Stop listing locations that are no longer relevant and ensure the
+        # new location is not evicted.
+        model.cancelFetches(path)
+        model.setActivePath(path)
+
+        # Filter the new location before resolving indexes through the proxy
+        # so that the location itself is not filtered out.
+        if self._filterWidget.text():
+            self._applyFilter(path)
+
+        # Ensure children for each segment in path are loaded, listing them
+        # concurrently. The location itself may be listed asynchronously as
+        # it is not needed to resolve the path.
+        locationIndex = model.ensurePathLoaded(path)
         segments = self._segmentPath(path)
-        for segment in reversed(segments):
-            pathIndex = model.pathIndex(segment)
-            model.fetchMore(pathIndex)
+        self._location = path
+        if model.isLoading(locationIndex):
+            self._statusLabel.setText('Loading...')
+        else:
+            self._statusLabel.clear()
+
+        model.fetchMore(locationIndex)
 
-        self._filesystemWidget.setRootIndex(model.pathIndex(path))
+        self._filesystemWidget.setRootIndex(locationIndex)
+
+        if self._prefetchScheduler is not None:
+            self._prefetchScheduler.schedule(locationIndex)
         self._locationWidget.clear()
 
         # Add history entry for each segment.
@@ -257,6 +384,19 @@ class FilesystemBrowser(QtGui.QDialog):
             self._upButton.setEnabled(False)
             self._upShortcut.setEnabled(False)
 
+    def refresh(self):
+        '''Update current location to match the filesystem.
+
+        Only entries that have changed are updated so the current selection is
+        retained.
+
+        '''
+        if self._location is None:
+            return
+
+        model = self._filesystemWidget.model()
+        model.refresh(model.pathIndex(self._location))
+
     def selected(self):
         '''Return selected paths.'''
         return self._selected[:]
@@ -0,0 +1,171 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import json
+import sqlite3
+import threading
+
+import riffle.core
+
+
+#: Version of the storage schema. Caches written with a different version are
+#: discarded when opened.
+SCHEMA_VERSION = 1
+
+
+class ListingCache(object):
+    '''Persistent cache of directory listings.
+
+    Each listing is stored with the modification time of the directory at the
+    time it was listed, so that it can be served immediately and later
+    revalidated by comparing against the current modification time.
+
+    Listings are stored in a SQLite database at the given path. Use
+    ``':memory:'`` to keep the cache in memory for the lifetime of the
+    instance only.
+
+    The cache may be safely used from multiple threads.
+
+    '''
+
+    def __init__(self, path):
+        '''Initialise cache stored at *path*.
+
+        The database and any missing parent directories will be created if
+        necessary.
+
+        '''
+        super(ListingCache, self).__init__()
+        self.path = path
+
+        if path != ':memory:':
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock:
+            version = self._connection.execute(
+                'PRAGMA user_version'
+            ).fetchone()[0]
+
+            if version != SCHEMA_VERSION:
+                self._connection.execute('DROP TABLE IF EXISTS listing')
+                self._connection.execute(
+                    'PRAGMA user_version = {0}'.format(SCHEMA_VERSION)
+                )
+
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS listing ('
+                'path TEXT PRIMARY KEY, modified REAL, entries TEXT)'
+            )
+            self._connection.commit()
+
+    def __repr__(self):
+        '''Return representation.'''
+        return '<{0} {1}>'.format(self.__class__.__name__, self.path)
+
+    def __contains__(self, path):
+        '''Return whether a listing of directory *path* is cached.'''
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT 1 FROM listing WHERE path = ?', (path,)
+            ).fetchone()
+
+        return row is not None
+
+    def get(self, path):
+        '''Return cached listing for directory *path*.
+
+        Return tuple of (modified, entries) where *modified* is the
+        modification time of the directory when listed and *entries* a list of
+        :py:class:`riffle.core.Entry` records. Return None if *path* is not
+        cached.
+
+        '''
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT modified, entries FROM listing WHERE path = ?',
+                (path,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        modified, data = row
+        kinds = riffle.core._KINDS
+
+        entries = [
+            riffle.core.Entry(
+                os.path.join(path, name), kinds[kind], size, entryModified
+            )
+            for name, kind, size, entryModified in json.loads(data)
+        ]
+
+        return modified, entries
+
+    def set(self, path, modified, entries):
+        '''Store listing of directory *path*.
+
+        *modified* should be the modification time of the directory
+        immediately before it was listed and *entries* an iterable of
+        :py:class:`riffle.core.Entry` records for its contents.
+
+        '''
+        self.update([(path, modified, entries)])
+
+    def update(self, listings):
+        '''Store multiple *listings* in a single transaction.
+
+        *listings* should be an iterable of (path, modified, entries) tuples
+        as accepted by :py:meth:`set`.
+
+        '''
+        codes = riffle.core._KIND_CODES
+        rows = [
+            (
+                path, modified,
+                json.dumps(
+                    [
+                        (
+                            os.path.basename(entry.path), codes[entry.kind],
+                            entry.size, entry.modified
+                        )
+                        for entry in entries
+                    ],
+                    separators=(',', ':')
+                )
+            )
+            for path, modified, entries in listings
+        ]
+
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO listing (path, modified, entries) '
+                'VALUES (?, ?, ?)',
+                rows
+            )
+            self._connection.commit()
+
+    def discard(self, path):
+        '''Remove cached listing for directory *path* if present.'''
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM listing WHERE path = ?', (path,)
+            )
+            self._connection.commit()
+
+    def clear(self):
+        '''Remove all cached listings.'''
+        with self._lock:
+            self._connection.execute('DELETE FROM listing')
+            self._connection.commit()
+
+    def close(self):
+        '''Close underlying database.'''
+        with self._lock:
+            self._connection.close()
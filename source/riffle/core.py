@@ -0,0 +1,1427 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import re
+import errno
+import stat
+import time
+import fnmatch
+import itertools
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+try:
+    from os import scandir
+except ImportError:
+    # Python < 3.5.
+    from scandir import scandir
+
+import clique
+
+import riffle.mount
+
+
+#: Record describing a single directory entry as returned by :py:func:`scan`.
+#:
+#: *kind* is one of :py:data:`FILE`, :py:data:`DIRECTORY` or
+#: :py:data:`MOUNT`. *size* and *modified* are taken from the stat result
+#: captured during the listing (*modified* as a timestamp).
+Entry = namedtuple('Entry', ['path', 'kind', 'size', 'modified'])
+
+#: Compact record of stat information held by an :py:class:`Item`.
+#:
+#: *modified* is stored as a timestamp.
+Stat = namedtuple('Stat', ['size', 'modified'])
+
+#: Entry kinds.
+FILE = 'file'
+DIRECTORY = 'directory'
+MOUNT = 'mount'
+
+#: Entry kinds ordered by the compact code used to store them.
+_KINDS = (FILE, DIRECTORY, MOUNT)
+_KIND_CODES = dict((kind, code) for code, kind in enumerate(_KINDS))
+
+#: Record of listed stat information for the members of a collection.
+#:
+#: Each attribute is an :py:class:`array.array` aligned with *indexes*, which
+#: are sorted in ascending order. Kinds are stored as compact codes.
+CollectionMembers = namedtuple(
+    'CollectionMembers', ['indexes', 'kinds', 'sizes', 'modified']
+)
+
+#: Type code of arrays holding member indexes and sizes. Python 2 does not
+#: support 64 bit ``'q'`` arrays so falls back to ``'l'``.
+try:
+    array('q')
+except ValueError:
+    _INTEGER_TYPECODE = 'l'
+else:
+    _INTEGER_TYPECODE = 'q'
+
+#: Aggregate information for a group of files.
+#:
+#: *size* is the total size in bytes, *count* the number of files and
+#: *modified* the latest modification timestamp (or None if there are no
+#: files).
+Aggregate = namedtuple('Aggregate', ['size', 'count', 'modified'])
+
+#: Shared children of items that have no children, avoiding a separate empty
+#: container per item.
+_NO_CHILDREN = ()
+
+#: Pattern used to group entries into collections.
+FRAMES_PATTERN = re.compile(clique.PATTERNS['frames'])
+
+
+def scan(path):
+    '''Yield :py:class:`Entry` for each valid filesystem entry under *path*.
+
+    Uses :py:func:`os.scandir` so that the type of each entry is determined
+    from the directory listing itself. At most one (cached) stat call is made
+    per entry to retrieve size, modification time and device. Mount points are
+    detected by comparing the device of each directory entry against the
+    device of *path*, which is only queried once, and against the mount table
+    if available (see :py:mod:`riffle.mount`) to also detect bind mounts.
+
+    Entries that cannot be classified (such as broken links) or that
+    disappear during the listing are skipped.
+
+    '''
+    parentStat = os.stat(path)
+    mountPaths = _mountPaths()
+
+    for entry in scandir(path):
+        entryPath = os.path.normpath(entry.path)
+
+        try:
+            if entry.is_dir():
+                kind = DIRECTORY
+                if entry.is_symlink():
+                    result = entry.stat()
+                else:
+                    result = entry.stat(follow_symlinks=False)
+                    if os.name != 'nt' and (
+                        result.st_dev != parentStat.st_dev
+                        or result.st_ino == parentStat.st_ino
+                        or entryPath in mountPaths
+                    ):
+                        kind = MOUNT
+
+            elif entry.is_file():
+                kind = FILE
+                result = entry.stat()
+
+            else:
+                continue
+
+        except OSError:
+            continue
+
+        yield Entry(entryPath, kind, result.st_size, result.st_mtime)
+
+
+def _mountPaths():
+    '''Return set of current mount point paths.
+
+    The set is empty if the mount table is not available.
+
+    '''
+    return riffle.mount.table().paths()
+
+
+def _emptyMembers():
+    '''Return empty :py:class:`CollectionMembers` to append members to.'''
+    return CollectionMembers(
+        array(_INTEGER_TYPECODE), array('b'), array(_INTEGER_TYPECODE),
+        array('d')
+    )
+
+
+class CollectionAssembler(object):
+    '''Assemble collections incrementally as entries are listed.
+
+    Produces the same collections and remainder as
+    ``clique.assemble(paths, [FRAMES_PATTERN])``, but entries are added one at
+    a time. Only entries that could belong to a collection are retained and
+    then only as a compact array of indexes per candidate collection, so
+    memory grows with the number of distinct collections rather than with the
+    number of paths. The kind, size and modification time of each candidate
+    are kept in compact arrays so that collection members can later be
+    created without querying the filesystem.
+
+    Example::
+
+        assembler = CollectionAssembler()
+        for entry in scan(path):
+            if not assembler.add(entry):
+                # Entry cannot be part of a collection.
+                ...
+
+        collections, remainder = assembler.assemble()
+
+    '''
+
+    def __init__(self, pattern=FRAMES_PATTERN, minimumItems=2):
+        '''Initialise assembler.
+
+        *pattern* is the compiled expression used to match candidate entries.
+        It must contain the :py:data:`clique.DIGITS_PATTERN` expression
+        exactly once.
+
+        *minimumItems* is the minimum number of indexes a collection must
+        have to be included in the result.
+
+        '''
+        super(CollectionAssembler, self).__init__()
+        self.pattern = pattern
+        self.minimumItems = minimumItems
+
+        # Map of (head, tail, padding) to [CollectionMembers, first entry].
+        self._candidates = {}
+
+    def add(self, entry):
+        '''Add *entry* and return whether it may be part of a collection.
+
+        *entry* should be an :py:class:`Entry` instance. Entries for which
+        False is returned are not retained by the assembler.
+
+        '''
+        match = self.pattern.search(entry.path)
+        if match is None:
+            return False
+
+        index = match.group('index')
+        head = entry.path[:match.start('index')]
+        tail = entry.path[match.end('index'):]
+
+        padding = 0
+        if match.group('padding'):
+            padding = len(index)
+
+        key = (head, tail, padding)
+        candidate = self._candidates.get(key)
+        if candidate is None:
+            candidate = [_emptyMembers(), entry]
+            self._candidates[key] = candidate
+
+        members = candidate[0]
+        members.indexes.append(int(index))
+        members.kinds.append(_KIND_CODES[entry.kind])
+        members.sizes.append(entry.size)
+        members.modified.append(entry.modified)
+
+        return True
+
+    def assemble(self):
+        '''Return assembled collections and remainder from added entries.
+
+        Return tuple of two lists (collections, remainder) where
+        'collections' is a list of (:py:class:`clique.Collection`,
+        :py:class:`CollectionMembers`) tuples and 'remainder' is a list of
+        (path, entry) tuples for entries that did not belong to any
+        collection. The entry will be None if not retained.
+
+        The assembler is emptied as part of this call.
+
+        '''
+        candidates = self._candidates
+        self._candidates = {}
+
+        collections = []
+        mergeCandidates = []
+        entries = {}
+
+        for (head, tail, padding), (members, entry) in candidates.items():
+            collection = clique.Collection(
+                head, tail, padding, set(members.indexes)
+            )
+            collections.append(collection)
+            entries[entry.path] = entry
+
+            if padding == 0:
+                mergeCandidates.append(collection)
+
+        # Merge unpadded collections into padded collections that they align
+        # with, matching the behaviour of clique.assemble.
+        fullyMerged = []
+        for collection in collections:
+            if collection.padding == 0:
+                continue
+
+            for candidate in mergeCandidates:
+                if (
+                    candidate.head == collection.head
+                    and candidate.tail == collection.tail
+                ):
+                    mergedCount = 0
+                    for index in candidate.indexes:
+                        if len(str(abs(index))) == collection.padding:
+                            collection.indexes.add(index)
+                            mergedCount += 1
+
+                    if mergedCount == len(candidate.indexes):
+                        fullyMerged.append(candidate)
+
+        collections = [
+            collection for collection in collections
+            if collection not in fullyMerged
+        ]
+
+        # Filter out collections with too few indexes, adding their members
+        # to the remainder unless part of another collection.
+        filtered = []
+        remainderCandidates = []
+        for collection in collections:
+            if len(collection.indexes) >= self.minimumItems:
+                filtered.append(collection)
+            else:
+                remainderCandidates.extend(collection)
+
+        remainder = []
+        seen = set()
+        for path in remainderCandidates:
+            if path in seen:
+                continue
+
+            for collection in filtered:
+                if path in collection:
+                    break
+            else:
+                seen.add(path)
+
+                # A filtered collection only ever holds the single index it
+                # was created with, which is the first entry retained.
+                remainder.append((path, entries.get(path)))
+
+        return (
+            [
+                (collection, self._members(collection, candidates))
+                for collection in filtered
+            ],
+            remainder
+        )
+
+    def _members(self, collection, candidates):
+        '''Return :py:class:`CollectionMembers` for *collection*.
+
+        *candidates* should be the candidates from which *collection* was
+        assembled, including any it was merged with.
+
+        '''
+        sources = []
+        keys = [(collection.head, collection.tail, collection.padding)]
+        if collection.padding:
+            keys.append((collection.head, collection.tail, 0))
+
+        for key in keys:
+            candidate = candidates.get(key)
+            if candidate is not None:
+                members = candidate[0]
+                positions = dict(
+                    (index, position)
+                    for position, index in enumerate(members.indexes)
+                )
+                sources.append((positions, members))
+
+        result = _emptyMembers()
+        for index in sorted(collection.indexes):
+            for positions, members in sources:
+                position = positions.get(index)
+                if position is not None:
+                    result.indexes.append(index)
+                    result.kinds.append(members.kinds[position])
+                    result.sizes.append(members.sizes[position])
+                    result.modified.append(members.modified[position])
+                    break
+
+        return result
+
+
+def ItemFactory(path, entry=None):
+    '''Return appropriate :py:class:`Item` instance for *path*.
+
+    If *path* is null then return Computer root.
+
+    If *entry* is specified it should be an :py:class:`Entry` for *path*
+    (typically from :py:func:`scan`) and will be used to determine the item
+    type without querying the filesystem again.
+
+    '''
+    if not path:
+        return Computer()
+
+    elif entry is not None:
+        itemStat = Stat(entry.size, entry.modified)
+
+        if entry.kind == FILE:
+            return File(path, stat=itemStat)
+
+        elif entry.kind == MOUNT:
+            return Mount(path, stat=itemStat)
+
+        elif entry.kind == DIRECTORY:
+            return Directory(path, stat=itemStat)
+
+        raise ValueError('Could not determine correct type for path: {0}'
+                         .format(path))
+
+    try:
+        result = os.stat(path)
+    except OSError:
+        raise ValueError('Could not determine correct type for path: {0}'
+                         .format(path))
+
+    itemStat = Stat(result.st_size, result.st_mtime)
+
+    if stat.S_ISREG(result.st_mode):
+        return File(path, stat=itemStat)
+
+    elif stat.S_ISDIR(result.st_mode):
+        if _isMount(path):
+            return Mount(path, stat=itemStat)
+
+        return Directory(path, stat=itemStat)
+
+    else:
+        raise ValueError('Could not determine correct type for path: {0}'
+                         .format(path))
+
+
+def _isMount(path):
+    '''Return whether directory *path* is a mount point.
+
+    Uses the mount table if available, falling back to
+    :py:func:`os.path.ismount` otherwise.
+
+    '''
+    table = riffle.mount.table()
+    if table.isAvailable():
+        return table.isMount(os.path.normpath(os.path.abspath(path)))
+
+    return os.path.ismount(path)
+
+
+def iterItems(entries):
+    '''Yield unparented :py:class:`Item` instances for *entries*.
+
+    *entries* should be an iterable of :py:class:`Entry` records, such as
+    returned by :py:func:`scan`.
+
+    Entries that cannot be part of a collection are yielded as soon as they
+    are consumed. Entries matching :py:data:`FRAMES_PATTERN` are grouped by a
+    :py:class:`CollectionAssembler` and yielded once *entries* is exhausted.
+
+    '''
+    assembler = CollectionAssembler()
+
+    for entry in entries:
+        if not assembler.add(entry):
+            yield ItemFactory(entry.path, entry)
+
+    # Handle collections.
+    collections, remainder = assembler.assemble()
+
+    for path, entry in remainder:
+        yield ItemFactory(path, entry)
+
+    for collection, members in collections:
+        yield Collection(collection, members=members)
+
+
+class Item(object):
+    '''Represent filesystem item.
+
+    Items use slots and only allocate containers for children once a child is
+    added, keeping the memory used per entry low when browsing directories
+    containing very many files.
+
+    .. note::
+
+        :py:attr:`children` is an empty tuple until a child is added.
+
+    '''
+
+    __slots__ = (
+        'path', 'children', 'parent', '_size', '_modified', '_aggregate',
+        '_row', '_childrenByName', '_childIterator', '_fetched'
+    )
+
+    #: Kind of :py:class:`Entry` the item is listed as, if any.
+    _kind = None
+
+    def __init__(self, path, stat=None):
+        '''Initialise item with *path*.
+
+        *stat* may be a :py:class:`Stat` record captured when *path* was
+        listed. If not specified, it will be retrieved from the filesystem on
+        first access and then cached.
+
+        '''
+        super(Item, self).__init__()
+        self.path = path
+
+        if stat is None:
+            self._size = None
+            self._modified = None
+        else:
+            self._size, self._modified = stat
+
+        self._aggregate = None
+
+        self.children = _NO_CHILDREN
+        self.parent = None
+        self._row = 0
+        self._childrenByName = None
+        self._childIterator = None
+        self._fetched = False
+
+    def __repr__(self):
+        '''Return representation.'''
+        return '<{0} {1}>'.format(self.__class__.__name__, self.path)
+
+    @property
+    def name(self):
+        '''Return name of item.'''
+        return os.path.basename(self.path) or self.path
+
+    @property
+    def size(self):
+        '''Return size of item.'''
+        if self._modified is None:
+            self.stat()
+
+        return self._size
+
+    @property
+    def type(self):
+        '''Return type of item as string.'''
+        return ''
+
+    @property
+    def modified(self):
+        '''Return last modified date of item.'''
+        if self._modified is None:
+            self.stat()
+
+        return datetime.fromtimestamp(self._modified)
+
+    def stat(self):
+        '''Return cached :py:class:`Stat` record for item.
+
+        The filesystem is only queried if no record is held, such as on first
+        access or after :py:meth:`invalidateStat`.
+
+        '''
+        if self._modified is None:
+            result = os.stat(self.path)
+            self._size = result.st_size
+            self._modified = result.st_mtime
+
+        return Stat(self._size, self._modified)
+
+    def invalidateStat(self):
+        '''Discard cached stat record so it is queried again when needed.'''
+        self._size = None
+        self._modified = None
+
+    def listedEntries(self):
+        '''Return list of :py:class:`Entry` records representing item.
+
+        Records are built from the stat information captured when the item was
+        listed, without querying the filesystem. Return None if the item was
+        not created from a listing.
+
+        '''
+        if self._kind is None or self._modified is None:
+            return None
+
+        return [Entry(self.path, self._kind, self._size, self._modified)]
+
+    @property
+    def aggregate(self):
+        '''Return :py:class:`Aggregate` for item or None.
+
+        Aggregates summarise all files represented by an item. They are not
+        computed by default for most items and must be set explicitly, such
+        as by :py:class:`Filesystem` when aggregating directories.
+
+        '''
+        return self._aggregate
+
+    @aggregate.setter
+    def aggregate(self, aggregate):
+        '''Set *aggregate* for item.'''
+        self._aggregate = aggregate
+
+    @property
+    def row(self):
+        '''Return index of this item in its parent or 0 if no parent.
+
+        The index is maintained by :py:meth:`addChild` and
+        :py:meth:`removeChild` so no search is required.
+
+        '''
+        if self.parent:
+            return self._row
+
+        return 0
+
+    def addChild(self, item):
+        '''Add *item* as child of this item.'''
+        if item.parent and item.parent != self:
+            item.parent.removeChild(item)
+
+        if self.children is _NO_CHILDREN:
+            self.children = []
+
+        item._row = len(self.children)
+        self.children.append(item)
+        if self._childrenByName is not None:
+            self._childrenByName[item.name] = item
+
+        item.parent = self
+
+    def removeChild(self, item):
+        '''Remove *item* from children.'''
+        row = item._row
+        if row >= len(self.children) or self.children[row] is not item:
+            raise ValueError('{0} is not a child of {1}'.format(item, self))
+
+        self.removeChildren(row, row)
+
+    def removeChildren(self, start, end):
+        '''Remove and return children from row *start* to *end* inclusive.'''
+        if not self.children:
+            return []
+
+        removed = self.children[start:end + 1]
+        del self.children[start:end + 1]
+
+        for item in removed:
+            if (
+                self._childrenByName is not None
+                and self._childrenByName.get(item.name) is item
+            ):
+                del self._childrenByName[item.name]
+
+            item.parent = None
+            item._row = 0
+
+        # Update index of subsequent children.
+        for index in range(start, len(self.children)):
+            self.children[index]._row = index
+
+        return removed
+
+    @property
+    def identity(self):
+        '''Return key identifying item amongst siblings across listings.'''
+        return (self.type, self.name)
+
+    def update(self, other):
+        '''Update item in place from *other* and return whether it changed.
+
+        *other* should be an item with the same :py:attr:`identity` from a
+        fresh listing.
+
+        '''
+        changed = False
+
+        if other._modified is not None and (
+            other._size != self._size or other._modified != self._modified
+        ):
+            # An item without a stat record has not been displayed so is not
+            # considered changed.
+            changed = self._modified is not None
+            self._size = other._size
+            self._modified = other._modified
+
+        if other.path != self.path:
+            names = None
+            if self.parent:
+                names = self.parent._childrenByName
+
+            if names is not None and names.get(self.name) is self:
+                del names[self.name]
+
+            self.path = other.path
+            if names is not None:
+                names[self.name] = self
+
+            changed = True
+
+        return changed
+
+    def findChild(self, name):
+        '''Return child with *name* or None if no such child is present.
+
+        An index of children by name is built on first use and then
+        maintained as children are added and removed.
+
+        '''
+        if self._childrenByName is None:
+            if not self.children:
+                return None
+
+            self._childrenByName = dict(
+                (child.name, child) for child in self.children
+            )
+
+        return self._childrenByName.get(name)
+
+    def canFetchMore(self):
+        '''Return whether more items can be fetched under this one.'''
+        if not self._fetched:
+            if self.mayHaveChildren():
+                return True
+
+        return False
+
+    def mayHaveChildren(self):
+        '''Return whether item may have children.'''
+        return True
+
+    def fetchChildren(self, limit=None):
+        '''Fetch and return new children.
+
+        Will only fetch children whilst canFetchMore is True.
+
+        If *limit* is specified, fetch at most *limit* children. Subsequent
+        calls continue from where the previous call finished and
+        canFetchMore remains True until all children have been fetched.
+
+        If listing fails the error is raised and canFetchMore remains True,
+        with the next call listing children from the start again.
+
+        .. note::
+
+            It is the caller's responsibility to add each fetched child to this
+            parent if desired using :py:meth:`Item.addChild`.
+
+        '''
+        if not self.canFetchMore():
+            return []
+
+        if self._childIterator is None:
+            self._childIterator = self._iterChildren()
+
+        try:
+            children = list(itertools.islice(self._childIterator, limit))
+        except Exception:
+            # Discard failed listing so that fetching starts again rather than
+            # continuing from an exhausted iterator.
+            close = getattr(self._childIterator, 'close', None)
+            if close is not None:
+                close()
+
+            self._childIterator = None
+            raise
+
+        if limit is None or len(children) < limit:
+            self._childIterator = None
+            self._fetched = True
+
+        return children
+
+    def _fetchChildren(self):
+        '''Fetch and return new child items.
+
+        Override in subclasses to fetch actual children and return list of
+        *unparented* :py:class:`Item` instances.
+
+        '''
+        return []
+
+    def _iterChildren(self):
+        '''Return iterator over new child items.
+
+        Override in subclasses that can produce *unparented*
+        :py:class:`Item` instances incrementally. The default implementation
+        iterates over the result of :py:meth:`_fetchChildren`.
+
+        '''
+        return iter(self._fetchChildren())
+
+    def refetch(self):
+        '''Reload children.'''
+        self.invalidateStat()
+
+        # Reset children
+        for child in self.children:
+            child.parent = None
+            child._row = 0
+
+        self.children = _NO_CHILDREN
+        self._childrenByName = None
+
+        # Discard any partially consumed listing.
+        if self._childIterator is not None:
+            close = getattr(self._childIterator, 'close', None)
+            if close is not None:
+                close()
+
+            self._childIterator = None
+
+        # Enable children fetching
+        self._fetched = False
+
+
+def _drives():
+    '''Return list of root paths of the filesystem.
+
+    On Windows, return the root of each available drive. Elsewhere return the
+    single root directory.
+
+    '''
+    if os.name != 'nt':
+        return ['/']
+
+    import ctypes
+    import string
+
+    mask = ctypes.windll.kernel32.GetLogicalDrives()
+    return [
+        '{0}:\\'.format(letter)
+        for position, letter in enumerate(string.ascii_uppercase)
+        if mask & (1 << position)
+    ]
+
+
+class Computer(Item):
+    '''Represent root.'''
+
+    __slots__ = ()
+
+    def __init__(self):
+        '''Initialise item.'''
+        super(Computer, self).__init__('')
+
+    @property
+    def name(self):
+        '''Return name of item.'''
+        return 'Computer'
+
+    @property
+    def type(self):
+        '''Return type of item as string.'''
+        return 'Root'
+
+    def _fetchChildren(self):
+        '''Fetch and return new child items.
+
+        Where the mount table is available, return a :py:class:`Mount` for
+        each mount point in it, excluding
+        :py:data:`riffle.mount.VIRTUAL_FILESYSTEM_TYPES`. Otherwise return
+        the root of each drive.
+
+        Only the mount table is consulted, so an unresponsive filesystem
+        does not delay the listing. Capacity is not queried and may be set
+        later, such as by :py:class:`riffle.model.Filesystem` when displayed.
+
+        '''
+        table = riffle.mount.table()
+        if not table.isAvailable():
+            return [Mount(os.path.normpath(path)) for path in _drives()]
+
+        children = []
+        for mountPoint in table.mounts():
+            if (
+                mountPoint.type in riffle.mount.VIRTUAL_FILESYSTEM_TYPES
+                and mountPoint.path != os.sep
+            ):
+                continue
+
+            children.append(
+                Mount(mountPoint.path, filesystemType=mountPoint.type)
+            )
+
+        return children
+
+
+class File(Item):
+    '''Represent file.'''
+
+    __slots__ = ()
+
+    _kind = FILE
+
+    @property
+    def type(self):
+        '''Return type of item as string.'''
+        return 'File'
+
+    def mayHaveChildren(self):
+        '''Return whether item may have children.'''
+        return False
+
+
+class Directory(Item):
+    '''Represent directory.'''
+
+    __slots__ = ()
+
+    _kind = DIRECTORY
+
+    @property
+    def type(self):
+        '''Return type of item as string.'''
+        return 'Directory'
+
+    @property
+    def size(self):
+        '''Return size of item.
+
+        If an :py:attr:`aggregate` is set this is the total size of all files
+        under the directory.
+
+        '''
+        if self._aggregate is not None:
+            return self._aggregate.size
+
+        return super(Directory, self).size
+
+    @property
+    def modified(self):
+        '''Return last modified date of item.
+
+        If an :py:attr:`aggregate` is set this is the latest modified date of
+        all files under the directory.
+
+        '''
+        if self._aggregate is not None:
+            if self._aggregate.modified is None:
+                return None
+
+            return datetime.fromtimestamp(self._aggregate.modified)
+
+        return super(Directory, self).modified
+
+    def _fetchChildren(self):
+        '''Fetch and return new child items.'''
+        return list(self._iterChildren())
+
+    def _iterChildren(self):
+        '''Yield new child items as they are listed.'''
+        return iterItems(scan(self.path))
+
+
+class Mount(Directory):
+    '''Represent mount point.'''
+
+    __slots__ = ('filesystemType', 'capacity')
+
+    _kind = MOUNT
+
+    def __init__(self, path, stat=None, filesystemType=None, capacity=None):
+        '''Initialise item with *path*.
+
+        *filesystemType* may be the type of the mounted filesystem and
+        *capacity* a :py:class:`riffle.mount.Capacity` record for it, if
+        known.
+
+        '''
+        super(Mount, self).__init__(path, stat=stat)
+        self.filesystemType = filesystemType
+        self.capacity = capacity
+
+    @property
+    def type(self):
+        '''Return type of item as string.'''
+        return 'Mount'
+
+    @property
+    def identity(self):
+        '''Return key identifying item amongst siblings across listings.
+
+        Mounts listed by :py:class:`Computer` may share a name, so are
+        identified by path instead.
+
+        '''
+        return (self.type, self.path)
+
+    @property
+    def size(self):
+        '''Return total capacity of mounted filesystem or None if unknown.'''
+        if self.capacity is None:
+            return None
+
+        return self.capacity.total
+
+    def _iterChildren(self):
+        '''Yield new child items as they are listed.
+
+        Mounts of single files, such as configuration files bind mounted into
+        containers, have no children.
+
+        '''
+        try:
+            for child in super(Mount, self)._iterChildren():
+                yield child
+
+        except OSError as error:
+            if error.errno != errno.ENOTDIR:
+                raise
+
+    def update(self, other):
+        '''Update item in place from *other* and return whether it changed.'''
+        changed = super(Mount, self).update(other)
+
+        if other.filesystemType != self.filesystemType:
+            self.filesystemType = other.filesystemType
+            changed = True
+
+        # A fresh listing does not query capacity, so keep any known value.
+        if other.capacity is not None and other.capacity != self.capacity:
+            self.capacity = other.capacity
+            changed = True
+
+        return changed
+
+    @property
+    def modified(self):
+        '''Return last modified date of item.'''
+        return None
+
+
+class Collection(Item):
+    '''Represent collection.'''
+
+    __slots__ = ('_collection', '_members')
+
+    def __init__(self, collection, members=None):
+        '''Initialise item with *collection*.
+
+        *collection* should be an instance of :py:class:`clique.Collection`.
+
+        *members* may be a :py:class:`CollectionMembers` record captured when
+        the collection was listed. If specified, member items are created from
+        it without querying the filesystem.
+
+        '''
+        self._collection = collection
+        self._members = members
+        super(Collection, self).__init__(self._collection.format())
+
+    @property
+    def type(self):
+        '''Return type of item as string.'''
+        return 'Collection'
+
+    @property
+    def identity(self):
+        '''Return key identifying item amongst siblings across listings.
+
+        Independent of the indexes present so that a collection can be
+        identified as it grows or shrinks.
+
+        '''
+        return (
+            self.type, self._collection.head, self._collection.tail,
+            self._collection.padding
+        )
+
+    def update(self, other):
+        '''Update item in place from *other* and return whether it changed.'''
+        changed = False
+        if other._collection.indexes != self._collection.indexes:
+            self._collection = other._collection
+            changed = True
+
+        if other._members is not None and other._members != self._members:
+            # Members without a listed record have not been compared so are
+            # not considered changed.
+            changed = changed or self._members is not None
+            self._members = other._members
+            self._aggregate = None
+
+        return super(Collection, self).update(other) or changed
+
+    @property
+    def aggregate(self):
+        '''Return :py:class:`Aggregate` for item or None.
+
+        Computed from the member information captured when the collection was
+        listed, if available.
+
+        '''
+        if self._aggregate is None and self._members is not None:
+            members = self._members
+            modified = None
+            if members.modified:
+                modified = max(members.modified)
+
+            self._aggregate = Aggregate(
+                sum(members.sizes), len(members.indexes), modified
+            )
+
+        return self._aggregate
+
+    @aggregate.setter
+    def aggregate(self, aggregate):
+        '''Set *aggregate* for item.'''
+        self._aggregate = aggregate
+
+    @property
+    def size(self):
+        '''Return total size of members or None if not known.'''
+        aggregate = self.aggregate
+        if aggregate is None:
+            return None
+
+        return aggregate.size
+
+    @property
+    def modified(self):
+        '''Return latest modified date of members or None if not known.'''
+        aggregate = self.aggregate
+        if aggregate is None or aggregate.modified is None:
+            return None
+
+        return datetime.fromtimestamp(aggregate.modified)
+
+    def _fetchChildren(self):
+        '''Fetch and return new child items.'''
+        return list(self._iterChildren())
+
+    def _iterChildren(self):
+        '''Yield new child items.
+
+        Members are created on demand, so only those fetched by the model are
+        ever built. If listed member information is available it is used in
+        place of querying the filesystem for each member.
+
+        '''
+        if self._members is None:
+            for path in self._collection:
+                try:
+                    yield ItemFactory(path)
+                except ValueError:
+                    pass
+
+            return
+
+        for entry in self._iterMemberEntries():
+            yield ItemFactory(entry.path, entry)
+
+    def listedEntries(self):
+        '''Return list of :py:class:`Entry` records representing item.
+
+        One record is returned per member. Return None if member information
+        was not captured when the collection was listed.
+
+        '''
+        if self._members is None:
+            return None
+
+        return list(self._iterMemberEntries())
+
+    def _iterMemberEntries(self):
+        '''Yield :py:class:`Entry` for each listed member.'''
+        members = self._members
+        head = self._collection.head
+        tail = self._collection.tail
+        padding = self._collection.padding
+
+        for position, index in enumerate(members.indexes):
+            path = '{0}{1:0{2}d}{3}'.format(head, index, padding, tail)
+            yield Entry(
+                path, _KINDS[members.kinds[position]],
+                members.sizes[position], members.modified[position]
+            )
+
+
+def _isAncestorPath(path, other):
+    '''Return whether *path* is the same as or an ancestor of *other*.'''
+    if path == other or not path:
+        return True
+
+    if not other.startswith(path):
+        return False
+
+    return path.endswith(os.sep) or other[len(path)] == os.sep
+
+
+def _timestamp(value):
+    '''Return timestamp for *value* which may be a datetime or number.'''
+    if isinstance(value, datetime):
+        return time.mktime(value.timetuple()) + value.microsecond / 1e6
+
+    return value
+
+
+class Filter(object):
+    '''Predicate accepting items according to precompiled criteria.
+
+    Criteria are compiled once on construction. Items are tested using the
+    attributes cached on them when listed, so that evaluating a filter never
+    queries the filesystem. Where an attribute is not known the item does not
+    match a criterion depending on it.
+
+    Use :py:meth:`evaluate` to test many items in one pass.
+
+    '''
+
+    def __init__(
+        self, pattern=None, regex=None, types=None, size=None, modified=None,
+        caseSensitive=False
+    ):
+        '''Initialise filter.
+
+        *pattern* is a glob style pattern the item name must match.
+
+        *regex* is a regular expression (string or compiled) that must be
+        found in the item name.
+
+        *types* is an iterable of item types to accept, such as
+        ``['File', 'Collection']``.
+
+        *size* is a (minimum, maximum) tuple of inclusive limits on item size
+        in bytes. Either limit may be None.
+
+        *modified* is a (earliest, latest) tuple of inclusive limits on item
+        modification time, as datetimes or timestamps. Either limit may be
+        None.
+
+        If *caseSensitive* is False then *pattern* and string *regex* values
+        ignore case.
+
+        Collections match *pattern* and *regex* by their name or by their
+        pattern, such as ``render.%04d.exr``.
+
+        '''
+        super(Filter, self).__init__()
+        self._nameMatches = []
+        self._predicates = []
+
+        flags = 0
+        if not caseSensitive:
+            flags = re.IGNORECASE
+
+        if pattern:
+            expression = re.compile(fnmatch.translate(pattern), flags)
+            self._nameMatches.append(expression.match)
+
+        if regex:
+            if not hasattr(regex, 'search'):
+                regex = re.compile(regex, flags)
+
+            self._nameMatches.append(regex.search)
+
+        if types is not None:
+            types = frozenset(types)
+            self._predicates.append(lambda item: item.type in types)
+
+        if size is not None:
+            self._predicates.append(
+                self._rangePredicate(self._size, size[0], size[1])
+            )
+
+        if modified is not None:
+            self._predicates.append(
+                self._rangePredicate(
+                    self._modified,
+                    _timestamp(modified[0]), _timestamp(modified[1])
+                )
+            )
+
+    def __call__(self, item):
+        '''Return whether *item* is accepted.'''
+        name = item.name
+        for match in self._nameMatches:
+            if match(name) is None and not self._matchPattern(match, item):
+                return False
+
+        for predicate in self._predicates:
+            if not predicate(item):
+                return False
+
+        return True
+
+    def isEmpty(self):
+        '''Return whether filter has no criteria and so accepts all items.'''
+        return not self._nameMatches and not self._predicates
+
+    def evaluate(self, items, names=None):
+        '''Return :py:class:`bytearray` of flags indicating accepted *items*.
+
+        *names* may be a list of the names of *items*, such as retained from
+        a previous evaluation, to avoid computing them again.
+
+        Each criterion is applied in turn to the items still accepted, so the
+        cost of later criteria reduces as earlier ones reject items.
+
+        '''
+        candidates = range(len(items))
+
+        if self._nameMatches and names is None:
+            names = [item.name for item in items]
+
+        for match in self._nameMatches:
+            candidates = [
+                position for position in candidates
+                if match(names[position]) is not None
+                or (
+                    type(items[position]) is Collection
+                    and self._matchPattern(match, items[position])
+                )
+            ]
+
+        for predicate in self._predicates:
+            candidates = [
+                position for position in candidates
+                if predicate(items[position])
+            ]
+
+        result = bytearray(len(items))
+        for position in candidates:
+            result[position] = 1
+
+        return result
+
+    @staticmethod
+    def _matchPattern(match, item):
+        '''Return whether *match* accepts pattern of collection *item*.'''
+        if not isinstance(item, Collection):
+            return False
+
+        name = os.path.basename(
+            item._collection.format('{head}{padding}{tail}')
+        )
+        return match(name) is not None
+
+    def _rangePredicate(self, getter, minimum, maximum):
+        '''Return predicate testing value from *getter* within limits.'''
+        def predicate(item):
+            '''Return whether value for *item* is within limits.'''
+            value = getter(item)
+            if value is None:
+                return False
+
+            if minimum is not None and value < minimum:
+                return False
+
+            if maximum is not None and value > maximum:
+                return False
+
+            return True
+
+        return predicate
+
+    @staticmethod
+    def _size(item):
+        '''Return known size of *item* without querying the filesystem.'''
+        if (
+            isinstance(item, (Collection, Mount))
+            or item._aggregate is not None
+        ):
+            return item.size
+
+        return item._size
+
+    @staticmethod
+    def _modified(item):
+        '''Return known modification timestamp of *item* or None.'''
+        if isinstance(item, Mount):
+            return None
+
+        aggregate = item.aggregate
+        if aggregate is not None:
+            return aggregate.modified
+
+        return item._modified
+
+
+class _Cancelled(Exception):
+    '''Raised internally when an aggregation is cancelled.'''
+
+
+def combine(aggregates):
+    '''Return single :py:class:`Aggregate` combining *aggregates*.'''
+    size = 0
+    count = 0
+    modified = None
+
+    for aggregate in aggregates:
+        size += aggregate.size
+        count += aggregate.count
+        if aggregate.modified is not None and (
+            modified is None or aggregate.modified > modified
+        ):
+            modified = aggregate.modified
+
+    return Aggregate(size, count, modified)
+
+
+def aggregate(path, cache=None, cancelled=None):
+    '''Return :py:class:`Aggregate` for all files under directory *path*.
+
+    Walks the directory tree in the manner of ``du -x``: symbolic links are
+    not followed and directories on other devices are not entered.
+    Unreadable subdirectories are skipped.
+
+    *cache* may be a mapping of directory paths to previously computed
+    aggregates. Cached values are reused in place of walking a directory
+    and newly computed values are added to it, so that after a change only
+    the invalidated directories need to be walked again.
+
+    *cancelled* may be a callable returning True if the operation should
+    stop, in which case None is returned.
+
+    '''
+    device = os.stat(path).st_dev
+
+    try:
+        return _aggregate(path, device, cache, cancelled)
+    except _Cancelled:
+        return None
+
+
+def _aggregate(path, device, cache, cancelled):
+    '''Return :py:class:`Aggregate` for *path* on *device*.'''
+    if cache is not None:
+        cached = cache.get(path)
+        if cached is not None:
+            return cached
+
+    if cancelled is not None and cancelled():
+        raise _Cancelled()
+
+    results = []
+    size = 0
+    count = 0
+    modified = None
+
+    for entry in scandir(path):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+
+            if entry.is_dir(follow_symlinks=False):
+                if stat.st_dev == device:
+                    results.append(
+                        _aggregate(entry.path, device, cache, cancelled)
+                    )
+                continue
+
+        except OSError:
+            continue
+
+        size += stat.st_size
+        count += 1
+        if modified is None or stat.st_mtime > modified:
+            modified = stat.st_mtime
+
+    results.append(Aggregate(size, count, modified))
+    result = combine(results)
+
+    if cancelled is not None and cancelled():
+        # Avoid caching a result that may have been invalidated.
+        raise _Cancelled()
+
+    if cache is not None:
+        cache[path] = result
+
+    return result
@@ -2,10 +2,23 @@
 # :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
 # :license: See LICENSE.txt.
 
+import os
 
 from PySide import QtGui
 
-import riffle.model
+import riffle.core
+
+
+def registerResources():
+    '''Register bundled icons with the Qt resource system.
+
+    Called when the first icon is created so that the compiled resources are
+    only loaded when needed. Call directly before using ``:riffle/`` resource
+    paths elsewhere.
+
+    '''
+    # Importing the compiled resource module registers its data.
+    import riffle.resource
 
 
 class IconType(object):
@@ -20,35 +33,99 @@ class IconType(object):
 
 
 class IconFactory(object):
-    '''Icon provider.'''
+    '''Icon provider.
+
+    Icons are created once per icon type and then reused.
+
+    Subclasses that style icons by file kind should set
+    :py:attr:`extensionIcons` to True and implement
+    :py:meth:`_createExtensionIcon`. Icons are then cached per icon type and
+    extension.
+
+    '''
+
+    #: Whether to create icons per file extension for files and collections.
+    extensionIcons = False
+
+    def __init__(self):
+        '''Initialise factory.'''
+        super(IconFactory, self).__init__()
+        self._cache = {}
+        self._extensionCache = {}
 
     def icon(self, specification):
         '''Return appropriate icon for *specification*.
 
         *specification* should be either:
 
-            * An instance of :py:class:`riffle.model.Item`
+            * An instance of :py:class:`riffle.core.Item`
             * One of the defined icon types (:py:class:`IconType`)
 
         '''
-        if isinstance(specification, riffle.model.Item):
-            specification = self.type(specification)
+        if isinstance(specification, riffle.core.Item):
+            item = specification
+            specification = self.type(item)
+
+            if self.extensionIcons and specification in (
+                IconType.File, IconType.Collection
+            ):
+                extension = self.extension(item)
+                key = (specification, extension)
+                try:
+                    return self._extensionCache[key]
+                except KeyError:
+                    icon = self._createExtensionIcon(specification, extension)
+                    self._extensionCache[key] = icon
+                    return icon
+
+        try:
+            return self._cache[specification]
+        except KeyError:
+            icon = self._createIcon(specification)
+            self._cache[specification] = icon
+            return icon
+
+    def clear(self):
+        '''Clear cached icons so they are created again when next requested.'''
+        self._cache.clear()
+        self._extensionCache.clear()
+
+    def extension(self, item):
+        '''Return lowercase extension (including leading dot) for *item*.'''
+        name = item.name
+        if isinstance(item, riffle.core.Collection):
+            # Strip ranges from collection name.
+            name = name.rsplit(' [', 1)[0]
+
+        return os.path.splitext(name)[1].lower()
+
+    def _createExtensionIcon(self, iconType, extension):
+        '''Return new icon for *iconType* and file *extension*.
+
+        Override in subclasses to provide icons per file kind. Default
+        implementation returns the icon for *iconType*.
+
+        '''
+        return self._createIcon(iconType)
 
+    def _createIcon(self, iconType):
+        '''Return new icon for *iconType*.'''
+        registerResources()
         icon = None
 
-        if specification == IconType.Computer:
+        if iconType == IconType.Computer:
             icon = QtGui.QIcon(':riffle/icon/computer')
 
-        elif specification == IconType.Mount:
+        elif iconType == IconType.Mount:
             icon = QtGui.QIcon(':riffle/icon/drive')
 
-        elif specification == IconType.Directory:
+        elif iconType == IconType.Directory:
             icon = QtGui.QIcon(':riffle/icon/folder')
 
-        elif specification == IconType.File:
+        elif iconType == IconType.File:
             icon = QtGui.QIcon(':riffle/icon/file')
 
-        elif specification == IconType.Collection:
+        elif iconType == IconType.Collection:
             icon = QtGui.QIcon(':riffle/icon/collection')
 
         return icon
@@ -57,19 +134,19 @@ class IconFactory(object):
         '''Return appropriate icon type for *item*.'''
         iconType = IconType.Unknown
 
-        if isinstance(item, riffle.model.Computer):
+        if isinstance(item, riffle.core.Computer):
             iconType = IconType.Computer
 
-        elif isinstance(item, riffle.model.Mount):
+        elif isinstance(item, riffle.core.Mount):
             iconType = IconType.Mount
 
-        elif isinstance(item, riffle.model.Directory):
+        elif isinstance(item, riffle.core.Directory):
             iconType = IconType.Directory
 
-        elif isinstance(item, riffle.model.File):
+        elif isinstance(item, riffle.core.File):
             iconType = IconType.File
 
-        elif isinstance(item, riffle.model.Collection):
+        elif isinstance(item, riffle.core.Collection):
             iconType = IconType.Collection
 
         return iconType
@@ -3,277 +3,247 @@
 # :license: See LICENSE.txt.
 
 import os
+import itertools
+from collections import OrderedDict
 from datetime import datetime
 
-from PySide.QtCore import Qt, QAbstractItemModel, QModelIndex, QDir
+from PySide.QtCore import (
+    Qt, QAbstractItemModel, QModelIndex, QObject, QRunnable, QThread,
+    QThreadPool, QTimer, Signal
+)
 from PySide.QtGui import QSortFilterProxyModel
-import clique
 
+import riffle.mount
 
-def ItemFactory(path):
-    '''Return appropriate :py:class:`Item` instance for *path*.
+# Items and listing are implemented without Qt in riffle.core and provided
+# here for convenience and compatibility.
+from riffle.core import (
+    Entry, Stat, FILE, DIRECTORY, MOUNT, CollectionMembers, Aggregate,
+    FRAMES_PATTERN, scan, CollectionAssembler, ItemFactory, iterItems, Item,
+    Computer, File, Directory, Mount, Collection, Filter, _isAncestorPath
+)
 
-    If *path* is null then return Computer root.
 
-    '''
-    if not path:
-        return Computer()
+#: Approximate memory in bytes used by each item held in a model, used to
+#: convert a byte budget into a number of items.
+ESTIMATED_ITEM_BYTES = 250
 
-    elif os.path.isfile(path):
-        return File(path)
 
-    elif os.path.ismount(path):
-        return Mount(path)
+def _modifiedTime(path):
+    '''Return modification time of *path* or None if not accessible.'''
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
 
-    elif os.path.isdir(path):
-        return Directory(path)
 
-    else:
-        raise ValueError('Could not determine correct type for path: {0}'
-                         .format(path))
+def _ranges(rows):
+    '''Return list of (start, end) inclusive ranges of contiguous *rows*.
 
+    *rows* should be sorted in ascending order.
 
-class Item(object):
-    '''Represent filesystem item.'''
+    '''
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
 
-    def __init__(self, path):
-        '''Initialise item with *path*.'''
-        super(Item, self).__init__()
-        self.path = path
+    return ranges
 
-        self.children = []
-        self.parent = None
-        self._fetched = False
 
-    def __repr__(self):
-        '''Return representation.'''
-        return '<{0} {1}>'.format(self.__class__.__name__, self.path)
+class _JobSignals(QObject):
+    '''Signals emitted by a worker job.'''
 
-    @property
-    def name(self):
-        '''Return name of item.'''
-        return os.path.basename(self.path) or self.path
+    #: Emitted with job and list of new child items.
+    batchReady = Signal(object, object)
 
-    @property
-    def size(self):
-        '''Return size of item.'''
-        return os.path.getsize(self.path)
+    #: Emitted with job, result and error (None on success) when job
+    #: completes.
+    finished = Signal(object, object, object)
 
-    @property
-    def type(self):
-        '''Return type of item as string.'''
-        return ''
 
-    @property
-    def modified(self):
-        '''Return last modified date of item.'''
-        return datetime.fromtimestamp(os.path.getmtime(self.path))
+class _FetchJob(QRunnable):
+    '''Fetch children of an item on a worker thread.
 
-    @property
-    def row(self):
-        '''Return index of this item in its parent or 0 if no parent.'''
-        if self.parent:
-            return self.parent.children.index(self)
+    The item itself is not modified by the job. New children are instead
+    emitted in batches so that they can be added to the item on the thread
+    that owns the model.
 
-        return 0
+    '''
 
-    def addChild(self, item):
-        '''Add *item* as child of this item.'''
-        if item.parent and item.parent != self:
-            item.parent.removeChild(item)
+    def __init__(self, item, batchSize, recordModified=False):
+        '''Initialise job to fetch children of *item* in *batchSize* batches.
 
-        self.children.append(item)
-        item.parent = self
+        If *recordModified* is True then the modification time of *item* is
+        stored as :py:attr:`modified` before listing.
 
-    def removeChild(self, item):
-        '''Remove *item* from children.'''
-        item.parent = None
-        self.children.remove(item)
+        '''
+        super(_FetchJob, self).__init__()
+        self.setAutoDelete(False)
 
-    def canFetchMore(self):
-        '''Return whether more items can be fetched under this one.'''
-        if not self._fetched:
-            if self.mayHaveChildren():
-                return True
+        self.item = item
+        self.batchSize = batchSize
+        self.recordModified = recordModified
+        self.modified = None
+        self.cancelled = False
 
-        return False
+        # Created on the calling thread so that connected slots are invoked on
+        # that thread too.
+        self.signals = _JobSignals()
 
-    def mayHaveChildren(self):
-        '''Return whether item may have children.'''
-        return True
+    def run(self):
+        '''Run job.'''
+        error = None
 
-    def fetchChildren(self):
-        '''Fetch and return new children.
+        if self.recordModified:
+            self.modified = _modifiedTime(self.item.path)
 
-        Will only fetch children whilst canFetchMore is True.
-
-        .. note::
+        try:
+            batch = []
+            for child in self.item._iterChildren():
+                if self.cancelled:
+                    break
 
-            It is the caller's responsibility to add each fetched child to this
-            parent if desired using :py:meth:`Item.addChild`.
+                batch.append(child)
+                if len(batch) >= self.batchSize:
+                    self.signals.batchReady.emit(self, batch)
+                    batch = []
 
-        '''
-        if not self.canFetchMore():
-            return []
+            if batch and not self.cancelled:
+                self.signals.batchReady.emit(self, batch)
 
-        children = self._fetchChildren()
-        self._fetched = True
+        except Exception as exception:
+            error = exception
 
-        return children
+        self.signals.finished.emit(self, None, error)
 
-    def _fetchChildren(self):
-        '''Fetch and return new child items.
 
-        Override in subclasses to fetch actual children and return list of
-        *unparented* :py:class:`Item` instances.
+class _ListJob(QRunnable):
+    '''List current children of an item on a worker thread.
 
-        '''
-        return []
+    Unlike :py:class:`_FetchJob` the listing is emitted as a whole on
+    completion so that it can be compared against existing children.
 
-    def refetch(self):
-        '''Reload children.'''
-        # Reset children
-        for child in self.children[:]:
-            self.removeChild(child)
+    The modification time of the item is stored as :py:attr:`modified` before
+    listing. The listing and any error are also stored as
+    :py:attr:`children` and :py:attr:`error` so that they can be read after
+    waiting for the job directly.
 
-        # Enable children fetching
-        self._fetched = False
+    '''
 
+    def __init__(self, item, modified=None):
+        '''Initialise job to list children of *item*.
 
-class Computer(Item):
-    '''Represent root.'''
+        If *modified* is specified then *item* is only listed if its current
+        modification time differs, otherwise None is emitted as the result.
 
-    def __init__(self):
-        '''Initialise item.'''
-        super(Computer, self).__init__('')
+        '''
+        super(_ListJob, self).__init__()
+        self.setAutoDelete(False)
+
+        self.item = item
+        self.previousModified = modified
+        self.modified = None
+        self.cancelled = False
+        self.repeat = False
+        self.children = None
+        self.error = None
+        self.signals = _JobSignals()
+
+    def run(self):
+        '''Run job.'''
+        children = None
+        error = None
+
+        self.modified = _modifiedTime(self.item.path)
+        if (
+            self.previousModified is not None
+            and self.modified == self.previousModified
+        ):
+            self.signals.finished.emit(self, None, None)
+            return
 
-    @property
-    def name(self):
-        '''Return name of item.'''
-        return 'Computer'
+        try:
+            children = self.item._fetchChildren()
+        except Exception as exception:
+            error = exception
 
-    @property
-    def type(self):
-        '''Return type of item as string.'''
-        return 'Root'
+        self.children = children
+        self.error = error
+        self.signals.finished.emit(self, children, error)
 
-    def _fetchChildren(self):
-        '''Fetch and return new child items.'''
-        children = []
-        for entry in QDir.drives():
-            path = os.path.normpath(entry.canonicalFilePath())
-            children.append(Mount(path))
 
-        return children
+class _PrefetchJob(_ListJob):
+    '''List children of an item on a low priority worker thread.'''
 
+    def run(self):
+        '''Run job.'''
+        if self.cancelled:
+            self.signals.finished.emit(self, None, None)
+            return
 
-class File(Item):
-    '''Represent file.'''
+        QThread.currentThread().setPriority(QThread.LowestPriority)
+        super(_PrefetchJob, self).run()
 
-    @property
-    def type(self):
-        '''Return type of item as string.'''
-        return 'File'
 
-    def mayHaveChildren(self):
-        '''Return whether item may have children.'''
-        return False
+class _CapacityJob(QRunnable):
+    '''Query capacity of a mounted filesystem on a worker thread.'''
 
+    def __init__(self, item):
+        '''Initialise job to query capacity of mount *item*.'''
+        super(_CapacityJob, self).__init__()
+        self.setAutoDelete(False)
 
-class Directory(Item):
-    '''Represent directory.'''
+        self.item = item
+        self.signals = _JobSignals()
 
-    @property
-    def type(self):
-        '''Return type of item as string.'''
-        return 'Directory'
-
-    def _fetchChildren(self):
-        '''Fetch and return new child items.'''
-        children = []
-
-        # List paths under this directory.
-        paths = []
-        for name in os.listdir(self.path):
-            paths.append(os.path.normpath(os.path.join(self.path, name)))
-
-        # Handle collections.
-        collections, remainder = clique.assemble(
-            paths, [clique.PATTERNS['frames']]
+    def run(self):
+        '''Run job.'''
+        self.signals.finished.emit(
+            self, riffle.mount.capacity(self.item.path), None
         )
 
-        for path in remainder:
-            try:
-                child = ItemFactory(path)
-            except ValueError:
-                pass
-            else:
-                children.append(child)
-
-        for collection in collections:
-            children.append(Collection(collection))
-
-        return children
-
-
-class Mount(Directory):
-    '''Represent mount point.'''
 
-    @property
-    def type(self):
-        '''Return type of item as string.'''
-        return 'Mount'
-
-    @property
-    def size(self):
-        '''Return size of item.'''
-        return None
+class _CacheWriteJob(QRunnable):
+    '''Write listings to a :py:class:`riffle.cache.ListingCache`.
 
-    @property
-    def modified(self):
-        '''Return last modified date of item.'''
-        return None
+    Listings are encoded and stored on a worker thread in a single
+    transaction.
 
+    '''
 
-class Collection(Item):
-    '''Represent collection.'''
-
-    def __init__(self, collection):
-        '''Initialise item with *collection*.
+    def __init__(self, cache, listings, discarded):
+        '''Initialise job to write to *cache*.
 
-        *collection* should be an instance of :py:class:`clique.Collection`.
+        *listings* should be a list of (path, modified, entries) tuples to
+        store and *discarded* a list of paths whose listings to remove.
 
         '''
-        self._collection = collection
-        super(Collection, self).__init__(self._collection.format())
+        super(_CacheWriteJob, self).__init__()
+        self.setAutoDelete(False)
 
-    @property
-    def type(self):
-        '''Return type of item as string.'''
-        return 'Collection'
+        self.cache = cache
+        self.listings = listings
+        self.discarded = discarded
+        self.signals = _JobSignals()
 
-    @property
-    def size(self):
-        '''Return size of item.'''
-        return None
+    def run(self):
+        '''Run job.'''
+        error = None
 
-    @property
-    def modified(self):
-        '''Return last modified date of item.'''
-        return None
+        try:
+            for path in self.discarded:
+                self.cache.discard(path)
 
-    def _fetchChildren(self):
-        '''Fetch and return new child items.'''
-        children = []
-        for path in self._collection:
-            try:
-                child = ItemFactory(path)
-            except ValueError:
-                pass
-            else:
-                children.append(child)
+            if self.listings:
+                self.cache.update(self.listings)
+
+        except Exception as exception:
+            error = exception
 
-        return children
+        self.signals.finished.emit(self, None, error)
 
 
 class Filesystem(QAbstractItemModel):
@@ -281,19 +251,166 @@ class Filesystem(QAbstractItemModel):
 
     ITEM_ROLE = Qt.UserRole + 1
 
-    def __init__(self, path='', parent=None, iconFactory=None):
-        '''Initialise with root *path*.'''
+    #: Emitted with item and loading state when an asynchronous fetch of the
+    #: item's children starts or stops.
+    loadingChanged = Signal(object, bool)
+
+    #: Emitted with item and error when fetching children of the item fails.
+    fetchFailed = Signal(object, object)
+
+    def __init__(
+        self, path='', parent=None, iconFactory=None, asynchronous=False,
+        watch=False, aggregateDirectories=False, cache=None
+    ):
+        '''Initialise with root *path*.
+
+        Children are added to the model in batches of :py:attr:`batchSize`.
+        By default, each call to :py:meth:`fetchMore` lists and adds one
+        batch so that the first entries of a large directory are displayed
+        immediately, with further batches fetched as views require them.
+
+        If *asynchronous* is True then :py:meth:`fetchMore` will instead list
+        all children on a worker thread, adding each batch to the model as it
+        becomes available.
+
+        If *watch* is True then fetched directories are watched for changes
+        using a :py:class:`riffle.watcher.Watcher`. Changes are applied to the
+        model incrementally, inserting, removing and updating only affected
+        rows. Changed directories are listed again on a worker thread after
+        :py:attr:`changeDelay` milliseconds, so that frequent changes are
+        coalesced without blocking the interface.
+
+        If *aggregateDirectories* is True then the size and modified date
+        displayed for directories are the total size and latest modified date
+        of all files under them. These are computed in the background, using
+        a :py:class:`riffle.aggregate.AggregateService`, when first displayed
+        and updated as directories change. Collections always display
+        aggregate values.
+
+        *cache* may be a :py:class:`riffle.cache.ListingCache` in which to
+        store directory listings. Directories with a cached listing are
+        populated from it immediately when first fetched and then revalidated
+        in the background, applying any changes incrementally, if their
+        modification time differs from when they were cached. Listings are
+        written to the cache on a worker thread and a directory changing
+        repeatedly is written at most once per second.
+
+        '''
         super(Filesystem, self).__init__(parent=parent)
         self.root = ItemFactory(path)
         self.columns = ['Name', 'Size', 'Type', 'Date Modified']
 
         if iconFactory is None:
-            # Local import to circumvent circular dependency.
+            # Local import as icons are not needed when one is provided.
             import riffle.icon_factory
             iconFactory = riffle.icon_factory.IconFactory()
 
         self.iconFactory = iconFactory
 
+        self.asynchronous = asynchronous
+        self.batchSize = 2000
+
+        self._threadPool = QThreadPool(self)
+        self._fetchJobs = {}
+        self._synchroniseJobs = {}
+        self._cancelledJobs = set()
+
+        self.watcher = None
+        self._watchedItems = {}
+        if watch:
+            # Local import so optional services are only loaded when used.
+            import riffle.watcher
+            self.watcher = riffle.watcher.Watcher(self)
+            self.watcher.directoryChanged.connect(self._onDirectoryChanged)
+
+        self._changedItems = OrderedDict()
+        self._changeTimer = QTimer(self)
+        self._changeTimer.setSingleShot(True)
+        self._changeTimer.setInterval(250)
+        self._changeTimer.timeout.connect(self._onChangeTimeout)
+
+        self.aggregator = None
+        self._aggregateItems = {}
+        if aggregateDirectories:
+            import riffle.aggregate
+            self.aggregator = riffle.aggregate.AggregateService(self)
+            self.aggregator.ready.connect(self._onAggregateReady)
+
+        self.cache = cache
+        self._listingModified = {}
+
+        # Map of path to (modified, entries) to store, or None to discard,
+        # for paths already written within the write interval.
+        self._cacheWrites = OrderedDict()
+        self._recentCacheWrites = set()
+        self._cacheWriteTimer = QTimer(self)
+        self._cacheWriteTimer.setSingleShot(True)
+        self._cacheWriteTimer.setInterval(1000)
+        self._cacheWriteTimer.timeout.connect(self._writeCache)
+
+        # Single thread so that writes are applied in order.
+        self._cacheThreadPool = QThreadPool(self)
+        self._cacheThreadPool.setMaxThreadCount(1)
+        self._cacheJobs = set()
+
+        #: Maximum number of items held in prefetched listings that have not
+        #: yet been added to the model. Least recently prefetched listings
+        #: are discarded to stay within the limit.
+        self.prefetchItemLimit = 50000
+
+        self._prefetchThreadPool = QThreadPool(self)
+        self._prefetchThreadPool.setMaxThreadCount(1)
+
+        # Separate pool so that waiting for path listings does not also wait
+        # for unrelated fetches. Listing is bound by filesystem latency rather
+        # than processor so more threads than processors are useful.
+        self._pathThreadPool = QThreadPool(self)
+        self._pathThreadPool.setMaxThreadCount(8)
+        self._prefetchJobs = {}
+        self._prefetched = OrderedDict()
+        self._prefetchedItemCount = 0
+
+        #: Maximum number of items to hold in the model, or None for no limit.
+        #: When exceeded, children of the least recently used items are
+        #: removed until within the limit. See :py:meth:`evict`.
+        self.maximumItemCount = None
+
+        #: Maximum estimated memory in bytes used by items held in the model,
+        #: or None for no limit. Estimated using
+        #: :py:data:`ESTIMATED_ITEM_BYTES`.
+        self.maximumByteCount = None
+
+        # Capacity queries may block indefinitely on unresponsive network
+        # filesystems so use a separate pool to avoid delaying listings.
+        self._capacityThreadPool = QThreadPool(self)
+        self._capacityThreadPool.setMaxThreadCount(2)
+        self._capacityJobs = {}
+
+        self._activePath = None
+        self._accessed = {}
+        self._accessCounter = itertools.count()
+        self._evictionScheduled = False
+
+    @property
+    def changeDelay(self):
+        '''Return delay in milliseconds before applying watched changes.'''
+        return self._changeTimer.interval()
+
+    @changeDelay.setter
+    def changeDelay(self, delay):
+        '''Set *delay* in milliseconds before applying watched changes.'''
+        self._changeTimer.setInterval(delay)
+
+    @property
+    def prefetchThreadCount(self):
+        '''Return maximum number of directories prefetched concurrently.'''
+        return self._prefetchThreadPool.maxThreadCount()
+
+    @prefetchThreadCount.setter
+    def prefetchThreadCount(self, count):
+        '''Set maximum *count* of directories prefetched concurrently.'''
+        self._prefetchThreadPool.setMaxThreadCount(count)
+
     def rowCount(self, parent):
         '''Return number of children *parent* index has.'''
         if parent.column() > 0:
@@ -304,6 +421,13 @@ class Filesystem(QAbstractItemModel):
         else:
             item = self.root
 
+        # Only track recent use when a limit may require eviction.
+        if item.children and (
+            self.maximumItemCount is not None
+            or self.maximumByteCount is not None
+        ):
+            self._accessed[item] = next(self._accessCounter)
+
         return len(item.children)
 
     def columnCount(self, parent):
@@ -342,41 +466,104 @@ class Filesystem(QAbstractItemModel):
         if not path.startswith(self.root.path):
             return QModelIndex()
 
-        parts = []
-        while True:
-            if path == self.root.path:
-                break
+        segments = self._pathSegments(path)
+        if segments:
+            item = self.root
 
-            head, tail = os.path.split(path)
-            if head == path:
-                if path:
-                    parts.append(path)
-                break
+            for name, _ in segments:
+                item = item.findChild(name)
+                if item is None:
+                    return QModelIndex()
 
-            parts.append(tail)
-            path = head
+            return self.createIndex(item.row, 0, item)
 
-        parts.reverse()
-        if parts:
-            item = self.root
-            count = 0
+        return QModelIndex()
 
-            for count, part in enumerate(parts):
-                matched = False
+    def ensurePathLoaded(self, path):
+        '''Fetch every directory leading to *path* and return its index.
 
-                for child in item.children:
-                    if child.name == part:
-                        item = child
-                        matched = True
-                        break
+        Directories from the root down to the parent of *path* that have not
+        been fully fetched are listed concurrently on worker threads, blocking
+        until all are complete, and then added to the model in a single pass.
+        Opening a deeply nested path therefore takes roughly as long as
+        listing one directory rather than every directory in turn.
 
-                if not matched:
-                    break
+        Directories with a listing in :py:attr:`cache` are not listed but
+        populated from the cache and revalidated in the background as with
+        :py:meth:`fetchMore`.
 
-            if count + 1 == len(parts):
-                return self.createIndex(item.row, 0, item)
+        Children of *path* itself are not fetched. Return an invalid index if
+        *path* is the root or could not be found.
 
-        return QModelIndex()
+        '''
+        if not path.startswith(self.root.path):
+            return QModelIndex()
+
+        segments = self._pathSegments(path)
+        if not segments:
+            return QModelIndex()
+
+        # Parent directory of each segment, with the item for it if known.
+        directories = [self.root.path]
+        directories.extend(segmentPath for _, segmentPath in segments[:-1])
+
+        item = self.root
+        items = []
+        for name, _ in segments:
+            items.append(item)
+            if item is not None:
+                item = item.findChild(name)
+
+        jobs = {}
+        for directory, item in zip(directories, items):
+            if item is None:
+                # Not yet known, so list speculatively by path unless it will
+                # be populated from the cache once known.
+                if not directory or self._isCached(directory):
+                    continue
+
+            elif not isinstance(item, Directory):
+                continue
+
+            else:
+                if item in self._fetchJobs:
+                    self.cancelFetch(self._itemIndex(item))
+
+                if not self._needsListing(item) or self._isCached(item.path):
+                    continue
+
+                self._cancelPrefetch(item)
+
+            job = _ListJob(Directory(directory))
+            jobs[directory] = job
+            self._pathThreadPool.start(job)
+
+        self._pathThreadPool.waitForDone()
+
+        item = self.root
+        index = QModelIndex()
+        for position, directory in enumerate(directories):
+            job = jobs.get(directory)
+            if (
+                job is not None and job.error is None
+                and job.children is not None
+                and isinstance(item, Directory) and self._needsListing(item)
+            ):
+                self._addChildren(index, item, job.children)
+                item._fetched = True
+                self._watch(item)
+                self._storeListing(item, job.modified)
+
+            else:
+                self.fetchAll(index)
+
+            item = item.findChild(segments[position][0])
+            if item is None:
+                return QModelIndex()
+
+            index = self._itemIndex(item)
+
+        return index
 
     def parent(self, index):
         '''Return parent of *index*.'''
@@ -414,16 +601,37 @@ class Filesystem(QAbstractItemModel):
 
         elif role == Qt.DisplayRole:
 
+            if (
+                column in (1, 3)
+                and self.aggregator is not None
+                and item._aggregate is None
+                and isinstance(item, Directory)
+                and not isinstance(item, Mount)
+            ):
+                self._requestAggregate(item)
+
+            if (
+                column == 1
+                and isinstance(item, Mount)
+                and item.capacity is None
+                and isinstance(item.parent, Computer)
+            ):
+                self._requestCapacity(item)
+
             if column == 0:
                 return item.name
             elif column == 1:
-                if item.size:
-                    return item.size
+                size = item.size
+                if size:
+                    return size
             elif column == 2:
+                if isinstance(item, Mount) and item.filesystemType:
+                    return '{0} ({1})'.format(item.type, item.filesystemType)
                 return item.type
             elif column == 3:
-                if item.modified is not None:
-                    return item.modified.strftime('%c')
+                modified = item.modified
+                if modified is not None:
+                    return modified.strftime('%c')
 
         elif role == Qt.DecorationRole:
             if column == 0:
@@ -469,51 +677,1239 @@ class Filesystem(QAbstractItemModel):
         else:
             item = index.internalPointer()
 
+        if item in self._fetchJobs:
+            return False
+
         return item.canFetchMore()
 
     def fetchMore(self, index):
-        '''Fetch additional data under *index*.'''
+        '''Fetch additional data under *index*.
+
+        If the model is :py:attr:`asynchronous` the fetch is started on a
+        worker thread and this method returns immediately.
+
+        '''
+        if not index.isValid():
+            item = self.root
+        else:
+            item = index.internalPointer()
+
+        if item in self._fetchJobs:
+            return
+
+        if item.canFetchMore():
+            if self._fetchPrefetched(index, item):
+                return
+
+            if self._fetchCached(index, item):
+                return
+
+            self._cancelPrefetch(item)
+
+            if self.asynchronous:
+                self._startFetch(item)
+            else:
+                first = item._childIterator is None
+                if first and self._canCache(item):
+                    self._listingModified[item] = _modifiedTime(item.path)
+
+                try:
+                    children = item.fetchChildren(self.batchSize)
+                except OSError as error:
+                    # Mark as fetched to avoid views retrying indefinitely.
+                    item._fetched = True
+                    self._listingModified.pop(item, None)
+                    self.fetchFailed.emit(item, error)
+                    return
+
+                self._addChildren(index, item, children)
+
+                # Watch from the first batch so that changes are not missed
+                # whilst remaining batches are waiting to be fetched.
+                if first:
+                    self._watch(item)
+
+                if not item.canFetchMore():
+                    self._storeListing(
+                        item, self._listingModified.pop(item, None)
+                    )
+
+    def fetchAll(self, index):
+        '''Fetch all remaining data under *index*, blocking until complete.
+
+        Any pending asynchronous fetch for *index* is cancelled and replaced.
+
+        '''
         if not index.isValid():
             item = self.root
         else:
             item = index.internalPointer()
 
+        self.cancelFetch(index)
+
         if item.canFetchMore():
-            startIndex = len(item.children)
-            additionalChildren = item.fetchChildren()
-            endIndex = startIndex + len(additionalChildren) - 1
-            if endIndex >= startIndex:
-                self.beginInsertRows(index, startIndex, endIndex)
-                for newChild in additionalChildren:
-                    item.addChild(newChild)
-                self.endInsertRows()
+            if self._fetchPrefetched(index, item):
+                return
+
+            if self._fetchCached(index, item):
+                return
+
+            self._cancelPrefetch(item)
+
+            modified = self._listingModified.pop(item, None)
+            if item._childIterator is None and self._canCache(item):
+                modified = _modifiedTime(item.path)
+
+            self._addChildren(index, item, item.fetchChildren())
+            self._watch(item)
+            self._storeListing(item, modified)
+
+    def refresh(self, index=None, recursive=False):
+        '''Update children of *index* to match the filesystem.
+
+        Unlike :py:meth:`reset`, the directory is listed again and compared
+        against the existing children by name and stat record. Only rows that
+        have been added, removed or changed are updated in the model so that
+        existing indexes, selection and scroll position are retained.
+
+        If *index* is not specified, refresh the root. If *recursive* is True
+        then also refresh any fetched descendants.
+
+        Items that have not been fetched, or that are still being fetched
+        asynchronously, are skipped. Items partially fetched in batches are
+        listed in full, completing the fetch.
+
+        '''
+        if index is None or not index.isValid():
+            item = self.root
+        else:
+            item = index.internalPointer()
+
+        if isinstance(item, Collection) and item.parent is not None:
+            # Membership of a collection is determined by its parent.
+            item = item.parent
+
+        pending = [item]
+        while pending:
+            item = pending.pop()
+            if not self._hasStartedFetch(item) or item in self._fetchJobs:
+                continue
+
+            self._synchronise(item)
+
+            if recursive:
+                pending.extend(
+                    child for child in item.children
+                    if not isinstance(child, Collection)
+                )
+
+    def prefetch(self, index):
+        '''List children of *index* in the background at low priority.
+
+        The listing is held until children of *index* are fetched, at which
+        point they are added to the model immediately. Directories that have
+        already been fetched, or are being fetched, are ignored.
+
+        At most :py:attr:`prefetchThreadCount` directories are listed
+        concurrently and prefetched listings are limited to a total of
+        :py:attr:`prefetchItemLimit` items.
+
+        '''
+        if not index.isValid():
+            item = self.root
+        else:
+            item = index.internalPointer()
+
+        if (
+            not isinstance(item, Directory)
+            or not item.canFetchMore()
+            or item.children
+            or item._childIterator is not None
+            or item in self._fetchJobs
+            or item in self._prefetchJobs
+            or item in self._prefetched
+        ):
+            return
+
+        job = _PrefetchJob(item)
+        job.signals.finished.connect(self._onPrefetchFinished)
+        self._prefetchJobs[item] = job
+        self._prefetchThreadPool.start(job)
+
+    def cancelPrefetches(self, keep=None):
+        '''Cancel pending prefetches.
+
+        *keep* may be an iterable of indexes whose prefetches should be
+        retained. Listings already prefetched are not discarded.
+
+        '''
+        retained = set()
+        if keep is not None:
+            for index in keep:
+                if index.isValid():
+                    retained.add(index.internalPointer())
+                else:
+                    retained.add(self.root)
+
+        for item in list(self._prefetchJobs.keys()):
+            if item not in retained:
+                self._cancelPrefetch(item)
+
+    def setActivePath(self, path):
+        '''Set active *path*, such as the location displayed by a view.
+
+        Items on *path* (the item at *path* and its ancestors) are never
+        evicted. Set to None to remove protection.
+
+        '''
+        self._activePath = path
+
+    def itemCount(self):
+        '''Return number of items currently held in the model.'''
+        return sum(len(item.children) for item in self._accessed)
+
+    def evict(self):
+        '''Evict least recently used items until within limits.
+
+        Items are used when their children are added or counted by a view.
+        Children of evicted items are removed from the model and the evicted
+        items returned to the unfetched state, so that they are fetched again
+        when next needed.
+
+        Items on the active path (see :py:meth:`setActivePath`) or with
+        pending fetches are not evicted.
+
+        Return number of items removed.
+
+        '''
+        self._evictionScheduled = False
+
+        limit = self._itemLimit()
+        if limit is None:
+            return 0
+
+        count = self.itemCount()
+        removed = 0
+
+        for item in sorted(self._accessed, key=self._accessed.get):
+            if count - removed <= limit:
+                break
+
+            if item not in self._accessed or not self._isEvictable(item):
+                # Released by an earlier eviction or protected.
+                continue
+
+            if not item.children:
+                # Nothing to evict.
+                del self._accessed[item]
+                continue
+
+            removed += self._evictItem(item)
+
+        return removed
+
+    def isLoading(self, index):
+        '''Return whether children of *index* are being fetched.'''
+        if not index.isValid():
+            item = self.root
+        else:
+            item = index.internalPointer()
+
+        return item in self._fetchJobs
+
+    def cancelFetch(self, index):
+        '''Cancel pending asynchronous fetch under *index*.
+
+        Any children already added by the fetch are removed so that the fetch
+        can be started afresh later.
+
+        '''
+        if not index.isValid():
+            item = self.root
+        else:
+            item = index.internalPointer()
+
+        job = self._fetchJobs.pop(item, None)
+        if job is None:
+            return
+
+        job.cancelled = True
+
+        # Keep reference until job completes on its thread.
+        self._cancelledJobs.add(job)
+
+        if item.children:
+            self.beginRemoveRows(index, 0, len(item.children) - 1)
+            self._releaseItems(item.children)
+            item.refetch()
+            self.endRemoveRows()
+
+        self.loadingChanged.emit(item, False)
+
+    def cancelFetches(self, path=None):
+        '''Cancel pending asynchronous fetches.
+
+        If *path* is specified, fetches for *path* and its ancestors are
+        retained.
+
+        '''
+        for item in list(self._fetchJobs.keys()):
+            if path is not None and _isAncestorPath(item.path, path):
+                continue
+
+            self.cancelFetch(self._itemIndex(item))
+
+    def _pathSegments(self, path):
+        '''Return list of (name, path) for each segment of *path* below root.
+
+        Segments are ordered from the root down.
+
+        '''
+        segments = []
+        while True:
+            if path == self.root.path:
+                break
+
+            head, tail = os.path.split(path)
+            if head == path:
+                if path:
+                    segments.append((path, path))
+                break
+
+            segments.append((tail, path))
+            path = head
+
+        segments.reverse()
+        return segments
+
+    def _needsListing(self, item):
+        '''Return whether *item* has not started fetching its children.
+
+        Items with a prefetched listing are not considered to need listing.
+
+        '''
+        return (
+            item.canFetchMore()
+            and not item.children
+            and item._childIterator is None
+            and item not in self._fetchJobs
+            and item not in self._prefetched
+        )
+
+    def _itemIndex(self, item):
+        '''Return index for *item*.'''
+        if item is self.root:
+            return QModelIndex()
+
+        return self.createIndex(item.row, 0, item)
+
+    def _addChildren(self, index, item, children):
+        '''Add *children* to *item* at *index*, notifying views.'''
+        startIndex = len(item.children)
+        endIndex = startIndex + len(children) - 1
+        if endIndex >= startIndex:
+            self.beginInsertRows(index, startIndex, endIndex)
+            for newChild in children:
+                item.addChild(newChild)
+            self.endInsertRows()
+
+            self._accessed[item] = next(self._accessCounter)
+            self._scheduleEviction()
+
+    def _startFetch(self, item):
+        '''Start asynchronous fetch of children for *item*.'''
+        job = _FetchJob(
+            item, self.batchSize, recordModified=self._canCache(item)
+        )
+        job.signals.batchReady.connect(self._onFetchBatchReady)
+        job.signals.finished.connect(self._onFetchFinished)
+
+        self._fetchJobs[item] = job
+        self.loadingChanged.emit(item, True)
+        self._threadPool.start(job)
+
+    def _onFetchBatchReady(self, job, children):
+        '''Add *children* fetched by *job*.'''
+        if self._fetchJobs.get(job.item) is not job:
+            # Cancelled.
+            return
+
+        self._addChildren(self._itemIndex(job.item), job.item, children)
+
+    def _onFetchFinished(self, job, result, error):
+        '''Handle completion of *job* with optional *error*.'''
+        self._cancelledJobs.discard(job)
+
+        if self._fetchJobs.get(job.item) is not job:
+            # Cancelled.
+            return
+
+        del self._fetchJobs[job.item]
+
+        # Mark as fetched even on error to avoid views retrying indefinitely.
+        job.item._fetched = True
+
+        self.loadingChanged.emit(job.item, False)
+        if error is not None:
+            self.fetchFailed.emit(job.item, error)
+        else:
+            self._watch(job.item)
+            self._storeListing(job.item, job.modified)
+
+    def _releaseItems(self, items):
+        '''Release resources held for *items* and their descendants.
+
+        Call before removing *items* from the model to cancel any pending jobs
+        and stop watching for changes.
+
+        '''
+        pending = list(items)
+        while pending:
+            item = pending.pop()
+
+            job = self._fetchJobs.pop(item, None)
+            if job is not None:
+                job.cancelled = True
+                self._cancelledJobs.add(job)
+                self.loadingChanged.emit(item, False)
+
+            job = self._synchroniseJobs.pop(item, None)
+            if job is not None:
+                job.cancelled = True
+                self._cancelledJobs.add(job)
+
+            if self._watchedItems.get(item.path) is item:
+                del self._watchedItems[item.path]
+                self.watcher.unwatch(item.path)
+
+            if self._aggregateItems.get(item.path) is item:
+                del self._aggregateItems[item.path]
+                self.aggregator.cancel(item.path)
+
+            job = self._capacityJobs.pop(item, None)
+            if job is not None:
+                # Keep reference until job completes on its thread.
+                self._cancelledJobs.add(job)
+
+            self._listingModified.pop(item, None)
+            self._changedItems.pop(item, None)
+            self._cancelPrefetch(item)
+            self._discardPrefetched(item)
+            self._accessed.pop(item, None)
+
+            pending.extend(item.children)
+
+    def _watch(self, item):
+        '''Watch fetched *item* for changes if watching enabled.'''
+        if self.watcher is None or not isinstance(item, Directory):
+            return
+
+        self._watchedItems[item.path] = item
+        self.watcher.watch(item.path)
+
+    def _cancelPrefetch(self, item):
+        '''Cancel pending prefetch of *item*.'''
+        job = self._prefetchJobs.pop(item, None)
+        if job is not None:
+            job.cancelled = True
+
+            # Keep reference until job completes on its thread.
+            self._cancelledJobs.add(job)
+
+    def _onPrefetchFinished(self, job, children, error):
+        '''Hold *children* prefetched by *job* until needed.'''
+        self._cancelledJobs.discard(job)
+
+        if self._prefetchJobs.get(job.item) is not job:
+            # Cancelled.
+            return
+
+        del self._prefetchJobs[job.item]
+
+        if error is not None or children is None:
+            return
+
+        self._prefetched[job.item] = (children, job.modified)
+        self._prefetchedItemCount += len(children)
+
+        while self._prefetchedItemCount > self.prefetchItemLimit:
+            self._discardPrefetched(next(iter(self._prefetched)))
+
+    def _discardPrefetched(self, item):
+        '''Discard prefetched listing of *item* and return it.
+
+        Return None if no listing was prefetched.
+
+        '''
+        prefetched = self._prefetched.pop(item, None)
+        if prefetched is not None:
+            self._prefetchedItemCount -= len(prefetched[0])
+
+        return prefetched
+
+    def _fetchPrefetched(self, index, item):
+        '''Populate *item* at *index* from prefetched listing if available.
+
+        Return whether *item* was populated. The listing is revalidated in the
+        background in case *item* changed since it was prefetched.
+
+        '''
+        if item.children or item._childIterator is not None:
+            return False
+
+        prefetched = self._discardPrefetched(item)
+        if prefetched is None:
+            return False
+
+        children, modified = prefetched
+
+        self._addChildren(index, item, children)
+        item._fetched = True
+        self._watch(item)
+        self._storeListing(item, modified)
+
+        if modified is not None:
+            self._startSynchronise(item, modified=modified)
+
+        return True
+
+    def _itemLimit(self):
+        '''Return maximum number of items to hold or None for no limit.'''
+        limits = []
+        if self.maximumItemCount is not None:
+            limits.append(self.maximumItemCount)
+
+        if self.maximumByteCount is not None:
+            limits.append(self.maximumByteCount // ESTIMATED_ITEM_BYTES)
+
+        if not limits:
+            return None
+
+        return min(limits)
+
+    def _scheduleEviction(self):
+        '''Schedule eviction once control returns to the event loop.
+
+        Deferring eviction ensures items are not removed whilst a caller may
+        still be using them.
+
+        '''
+        if self._evictionScheduled or self._itemLimit() is None:
+            return
+
+        self._evictionScheduled = True
+        QTimer.singleShot(0, self.evict)
+
+    def _isEvictable(self, item):
+        '''Return whether children of *item* may be evicted.'''
+        if item is self.root or item.parent is None:
+            return False
+
+        if self._activePath is not None and _isAncestorPath(
+            item.path, self._activePath
+        ):
+            return False
+
+        return (
+            item not in self._fetchJobs and item not in self._synchroniseJobs
+        )
+
+    def _evictItem(self, item):
+        '''Remove children of *item* and return number of items removed.'''
+        removed = 0
+        pending = [item]
+        while pending:
+            current = pending.pop()
+            removed += len(current.children)
+            pending.extend(current.children)
+
+        index = self._itemIndex(item)
+        stat = (item._size, item._modified)
+
+        self.beginRemoveRows(index, 0, len(item.children) - 1)
+        self._releaseItems(item.children)
+        item.refetch()
+        self.endRemoveRows()
+
+        # Retain stat captured when listed to avoid querying it again.
+        item._size, item._modified = stat
+
+        del self._accessed[item]
+        self._listingModified.pop(item, None)
+        if self._watchedItems.get(item.path) is item:
+            del self._watchedItems[item.path]
+            self.watcher.unwatch(item.path)
+
+        return removed
+
+    def _isCached(self, path):
+        '''Return whether a listing of directory *path* is cached.'''
+        if self.cache is None:
+            return False
+
+        if path in self._cacheWrites:
+            return self._cacheWrites[path] is not None
+
+        return path in self.cache
+
+    def _canCache(self, item):
+        '''Return whether listing of *item* can be cached.'''
+        return self.cache is not None and isinstance(item, Directory)
+
+    def _fetchCached(self, index, item):
+        '''Populate *item* at *index* from cache and return whether cached.
+
+        Only items that have not started fetching are populated. A cached
+        listing is revalidated in the background and any changes applied.
+
+        '''
+        if (
+            not self._canCache(item)
+            or item.children
+            or item._childIterator is not None
+        ):
+            return False
+
+        # Prefer a listing still waiting to be written.
+        if item.path in self._cacheWrites:
+            cached = self._cacheWrites[item.path]
+        else:
+            cached = self.cache.get(item.path)
+
+        if cached is None:
+            return False
+
+        modified, entries = cached
+
+        self._addChildren(index, item, list(iterItems(entries)))
+        item._fetched = True
+        self._watch(item)
+
+        self._startSynchronise(item, modified=modified)
+        return True
+
+    def _storeListing(self, item, modified):
+        '''Store listing of fetched *item* made at *modified* in cache.
+
+        If a listing of *item* was written recently the write is delayed,
+        replacing any listing of *item* still waiting to be written.
+
+        '''
+        if not self._canCache(item) or modified is None:
+            return
+
+        entries = []
+        for child in item.children:
+            childEntries = child.listedEntries()
+            if childEntries is None:
+                return
+
+            entries.extend(childEntries)
+
+        self._scheduleCacheWrite(item.path, (modified, entries))
+
+    def _discardListing(self, path):
+        '''Remove cached listing of directory *path*.'''
+        if self.cache is not None:
+            self._scheduleCacheWrite(path, None)
+
+    def _scheduleCacheWrite(self, path, listing):
+        '''Schedule writing *listing* for *path* to cache.
+
+        *listing* should be a (modified, entries) tuple or None to remove the
+        listing for *path*.
+
+        The listing is written immediately unless *path* was written within
+        the write interval, in which case it is written, together with any
+        other delayed listings, when the interval ends.
+
+        '''
+        if path in self._recentCacheWrites:
+            self._cacheWrites.pop(path, None)
+            self._cacheWrites[path] = listing
+        else:
+            self._recentCacheWrites.add(path)
+            self._startCacheWrite({path: listing})
+
+        if not self._cacheWriteTimer.isActive():
+            self._cacheWriteTimer.start()
+
+    def _writeCache(self):
+        '''Write delayed listings to cache and start next interval.'''
+        writes = self._cacheWrites
+        self._cacheWrites = OrderedDict()
+
+        # Paths written now are throttled for another interval.
+        self._recentCacheWrites = set(writes)
+        if not writes:
+            return
+
+        self._startCacheWrite(writes)
+        self._cacheWriteTimer.start()
+
+    def _startCacheWrite(self, writes):
+        '''Start writing *writes* to cache on a worker thread.
+
+        *writes* should be a mapping of path to listing as accepted by
+        :py:meth:`_scheduleCacheWrite`.
+
+        '''
+        listings = []
+        discarded = []
+        for path, listing in writes.items():
+            if listing is None:
+                discarded.append(path)
+            else:
+                listings.append((path, listing[0], listing[1]))
+
+        job = _CacheWriteJob(self.cache, listings, discarded)
+        job.signals.finished.connect(self._onCacheWriteFinished)
+
+        # Keep reference until job completes on its thread.
+        self._cacheJobs.add(job)
+        self._cacheThreadPool.start(job)
+
+    def _onCacheWriteFinished(self, job, result, error):
+        '''Release completed *job*.
+
+        Failing to write to the cache only loses the benefit of caching so
+        any *error* is ignored.
+
+        '''
+        self._cacheJobs.discard(job)
+
+    def _requestAggregate(self, item):
+        '''Request aggregate for directory *item*.'''
+        if item.path in self._aggregateItems:
+            return
+
+        aggregate = self.aggregator.request(item.path)
+        if aggregate is not None:
+            item.aggregate = aggregate
+        else:
+            self._aggregateItems[item.path] = item
+
+    def _onAggregateReady(self, path, aggregate):
+        '''Set computed *aggregate* on item with *path*.'''
+        item = self._aggregateItems.pop(path, None)
+        if item is None:
+            return
+
+        item.aggregate = aggregate
+        self.dataChanged.emit(
+            self.createIndex(item.row, 1, item),
+            self.createIndex(item.row, 3, item)
+        )
+
+    def _requestCapacity(self, item):
+        '''Request capacity of mount *item* in the background.
+
+        Capacity is only requested once per item.
+
+        '''
+        if item in self._capacityJobs:
+            return
+
+        job = _CapacityJob(item)
+        job.signals.finished.connect(self._onCapacityFinished)
+        self._capacityJobs[item] = job
+        self._capacityThreadPool.start(job)
+
+    def _onCapacityFinished(self, job, capacity, error):
+        '''Set *capacity* queried by *job* on its item.'''
+        self._cancelledJobs.discard(job)
+
+        if self._capacityJobs.get(job.item) is not job:
+            # Released.
+            return
+
+        # Retain entry so that capacity is not requested again.
+        self._capacityJobs[job.item] = None
+
+        if capacity is None:
+            return
+
+        job.item.capacity = capacity
+        index = self.createIndex(job.item.row, 1, job.item)
+        self.dataChanged.emit(index, index)
+
+    def _invalidateAggregates(self, item):
+        '''Invalidate aggregates of *item* and its ancestors.'''
+        if self.aggregator is None:
+            return
+
+        self.aggregator.invalidate(item.path)
+
+        while item is not None and item is not self.root:
+            if item._aggregate is not None:
+                item.aggregate = None
+
+                # Notify views so that the aggregate is requested again if
+                # displayed.
+                self.dataChanged.emit(
+                    self.createIndex(item.row, 1, item),
+                    self.createIndex(item.row, 3, item)
+                )
+
+            item = item.parent
+
+    def _onDirectoryChanged(self, path):
+        '''Schedule synchronising watched directory at *path*.
+
+        Synchronising is delayed so that repeated changes, such as frames
+        being written by a render, are applied together.
+
+        '''
+        item = self._watchedItems.get(path)
+        if item is None:
+            return
+
+        self._changedItems[item] = None
+        if not self._changeTimer.isActive():
+            self._changeTimer.start()
+
+    def _onChangeTimeout(self):
+        '''Synchronise changed directories on a worker thread.'''
+        changed = self._changedItems
+        self._changedItems = OrderedDict()
+
+        for item in changed:
+            if (
+                self._watchedItems.get(item.path) is item
+                and item not in self._fetchJobs
+            ):
+                self._synchronise(item, background=True)
+
+    def _synchronise(self, item, background=False):
+        '''Update children of *item* to match the filesystem.
+
+        Lists *item* again and applies the differences to the model. If
+        *item* was only partially fetched then the full listing completes the
+        fetch.
+
+        The listing is made on a worker thread if :py:attr:`asynchronous` or
+        *background* is True, otherwise it blocks until complete.
+
+        '''
+        job = self._synchroniseJobs.get(item)
+        if job is not None:
+            # Listing already in progress so repeat once complete to pick up
+            # any later changes.
+            job.repeat = True
+            return
+
+        if not self.asynchronous and not background:
+            modified = None
+            if self._canCache(item):
+                modified = _modifiedTime(item.path)
+
+            try:
+                children = item._fetchChildren()
+            except OSError:
+                # Removal of item will be handled by its parent.
+                return
+
+            self._applyChildren(item, children)
+            self._completeFetch(item)
+            self._storeListing(item, modified)
+            return
+
+        self._startSynchronise(item)
+
+    def _startSynchronise(self, item, modified=None):
+        '''Start listing *item* on a worker thread to synchronise it.
+
+        If *modified* is specified then the listing is skipped if the
+        modification time of *item* has not changed.
+
+        '''
+        job = _ListJob(item, modified=modified)
+        job.signals.finished.connect(self._onSynchroniseFinished)
+        self._synchroniseJobs[item] = job
+        self._threadPool.start(job)
+
+    def _onSynchroniseFinished(self, job, children, error):
+        '''Apply listed *children* from *job* unless *error* occurred.'''
+        self._cancelledJobs.discard(job)
+
+        if self._synchroniseJobs.get(job.item) is not job:
+            # Cancelled.
+            return
+
+        del self._synchroniseJobs[job.item]
+
+        if error is not None:
+            self._discardListing(job.item.path)
+
+        elif children is not None:
+            self._applyChildren(job.item, children)
+            self._completeFetch(job.item)
+            self._storeListing(job.item, job.modified)
+
+        if job.repeat:
+            self._synchronise(job.item, background=True)
+
+    def _applyChildren(self, item, children):
+        '''Update existing children of *item* to match *children*.
+
+        Children are matched by :py:attr:`Item.identity`. Rows for children no
+        longer present are removed, matched children are updated in place
+        and new children are appended.
+
+        '''
+        index = self._itemIndex(item)
+
+        updates = {}
+        for child in children:
+            updates[child.identity] = child
+
+        # Remove missing children, working backwards so that rows remain
+        # valid.
+        missing = [
+            row for row, child in enumerate(item.children)
+            if child.identity not in updates
+        ]
+        for start, end in reversed(_ranges(missing)):
+            self.beginRemoveRows(index, start, end)
+            self._releaseItems(item.children[start:end + 1])
+            item.removeChildren(start, end)
+            self.endRemoveRows()
+
+        changed = bool(missing)
+
+        # Update remaining children in place.
+        lastColumn = len(self.columns) - 1
+        for child in item.children:
+            update = updates.pop(child.identity)
+            if child.update(update):
+                changed = True
+                self.dataChanged.emit(
+                    self.createIndex(child.row, 0, child),
+                    self.createIndex(child.row, lastColumn, child)
+                )
+
+                if (
+                    isinstance(child, Collection)
+                    and self._hasStartedFetch(child)
+                ):
+                    self._applyChildren(child, child._fetchChildren())
+                    self._completeFetch(child)
+
+        # Add new children, preserving listing order.
+        if updates:
+            changed = True
+            self._addChildren(
+                index, item,
+                [child for child in children if child.identity in updates]
+            )
+
+        if changed:
+            self._invalidateAggregates(item)
+
+    def _hasStartedFetch(self, item):
+        '''Return whether fetching children of *item* has started.'''
+        return item._fetched or item._childIterator is not None
+
+    def _completeFetch(self, item):
+        '''Mark *item* as fully fetched once all children are synchronised.
+
+        Any partially consumed listing is discarded as the synchronised
+        children supersede it.
+
+        '''
+        iterator = item._childIterator
+        if iterator is not None:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+            item._childIterator = None
+
+        item._fetched = True
+        self._listingModified.pop(item, None)
 
     def reset(self):
         '''Reset model'''
+        self.cancelFetches()
         self.beginResetModel()
+        self._releaseItems([self.root])
+
+        if self.aggregator is not None:
+            self.aggregator.clear()
+
         self.root.refetch()
         self.endResetModel()
 
 
 class FilesystemSortProxy(QSortFilterProxyModel):
-    '''Sort directories before files.'''
+    '''Sort directories before files and optionally filter items.
+
+    A sort key is computed once per item from its cached attributes and
+    reused for every comparison until the sort column, order or case
+    sensitivity changes, or the item changes in the source model.
+
+    Filtering uses a :py:class:`Filter` set with :py:meth:`setFilter`. The
+    filter is evaluated over all children of a parent at once and the result
+    cached, extending it as further children are added.
+
+    '''
+
+    def __init__(self, parent=None):
+        '''Initialise proxy with optional *parent*.'''
+        super(FilesystemSortProxy, self).__init__(parent=parent)
+        self._sortKeys = {}
+        self._sortKeyOrder = Qt.AscendingOrder
+        self._sortKeyCaseSensitive = True
+
+        self._filter = None
+        self._filterPath = None
+        self._accepted = {}
+        self._names = {}
+
+    def setSourceModel(self, sourceModel):
+        '''Set *sourceModel* to proxy.'''
+        previousSourceModel = self.sourceModel()
+        if previousSourceModel:
+            previousSourceModel.dataChanged.disconnect(
+                self._onSourceDataChanged
+            )
+            previousSourceModel.rowsAboutToBeRemoved.disconnect(
+                self._onSourceRowsAboutToBeRemoved
+            )
+            previousSourceModel.rowsAboutToBeInserted.disconnect(
+                self._onSourceRowsAboutToBeInserted
+            )
+            previousSourceModel.modelReset.disconnect(self._clearCaches)
+            previousSourceModel.layoutChanged.disconnect(self._clearCaches)
+
+        self._clearCaches()
+
+        if sourceModel:
+            # Connect before the base class connects its own handlers so that
+            # cached keys are discarded before any re-sort.
+            sourceModel.dataChanged.connect(self._onSourceDataChanged)
+            sourceModel.rowsAboutToBeRemoved.connect(
+                self._onSourceRowsAboutToBeRemoved
+            )
+            sourceModel.rowsAboutToBeInserted.connect(
+                self._onSourceRowsAboutToBeInserted
+            )
+            sourceModel.modelReset.connect(self._clearCaches)
+            sourceModel.layoutChanged.connect(self._clearCaches)
+
+        super(FilesystemSortProxy, self).setSourceModel(sourceModel)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        '''Sort by *column* in *order*.'''
+        self._clearSortKeys()
+        self._sortKeyOrder = order
+        self._sortKeyCaseSensitive = (
+            self.sortCaseSensitivity() == Qt.CaseSensitive
+        )
+        super(FilesystemSortProxy, self).sort(column, order)
+
+    def setSortCaseSensitivity(self, sensitivity):
+        '''Set case *sensitivity* used when sorting by name.
+
+        Cached sort keys are discarded before any re-sort so that names are
+        compared using the new *sensitivity*.
+
+        '''
+        self._clearSortKeys()
+        self._sortKeyCaseSensitive = sensitivity == Qt.CaseSensitive
+        super(FilesystemSortProxy, self).setSortCaseSensitivity(sensitivity)
+
+    def filter(self):
+        '''Return current :py:class:`Filter` or None if not filtering.'''
+        return self._filter
+
+    def setFilter(self, filter=None, path=None, **kwargs):
+        '''Filter items using *filter*.
+
+        *filter* should be a :py:class:`Filter`. Alternatively, pass keyword
+        arguments to construct one, such as
+        ``setFilter(pattern='*.exr', types=['File', 'Collection'])``. Set
+        *filter* to None (without keyword arguments) to stop filtering.
+
+        If *path* is specified then only the children of the item at *path*
+        are filtered and all other rows, such as ancestors of *path*, are
+        accepted.
+
+        '''
+        if filter is None and kwargs:
+            filter = Filter(**kwargs)
+
+        if filter is not None and filter.isEmpty():
+            filter = None
+
+        self._filter = filter
+        self._filterPath = path
+        self._accepted.clear()
+        self.invalidateFilter()
+
+    def clearFilter(self):
+        '''Stop filtering items.'''
+        self.setFilter(None)
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        '''Return whether *sourceRow* under *sourceParent* is accepted.'''
+        if self._filter is None:
+            return True
+
+        parent = self._sourceItem(sourceParent)
+        if parent is None:
+            # Not a hierarchy of items so evaluate directly.
+            item = self.sourceModel().index(sourceRow, 0, sourceParent)
+            return self._filter(item.internalPointer())
+
+        if self._filterPath is not None and parent.path != self._filterPath:
+            return True
+
+        accepted = self._accepted.get(parent)
+        if accepted is None:
+            accepted = self._accepted[parent] = bytearray()
+
+        if sourceRow >= len(accepted):
+            # Names are retained across filters as they are the most costly
+            # attribute to compute.
+            children = parent.children
+            names = self._names.get(parent)
+            if names is None:
+                names = self._names[parent] = []
+
+            if len(names) < len(children):
+                names.extend(
+                    child.name for child in children[len(names):]
+                )
+
+            start = len(accepted)
+            accepted.extend(
+                self._filter.evaluate(children[start:], names[start:])
+            )
+
+        return bool(accepted[sourceRow])
 
     def lessThan(self, left, right):
         '''Return ordering of *left* vs *right*.'''
+        return self._sortKey(left) < self._sortKey(right)
+
+    def _sortKey(self, index):
+        '''Return sort key for source *index*.
+
+        The key is a tuple of a flag that places directories first for the
+        current sort order, followed by the value for the column of *index*.
+
+        '''
+        item = index.internalPointer()
+
+        try:
+            return self._sortKeys[item]
+        except KeyError:
+            pass
+
+        column = index.column()
+        if column == 0:
+            value = item.name
+            if not self._sortKeyCaseSensitive:
+                value = value.lower()
+
+        elif column == 1:
+            value = item.size or 0
+
+        elif column == 2:
+            value = item.type
+
+        elif column == 3:
+            value = item.modified
+            if value is None:
+                value = datetime.min
+
+        else:
+            value = None
+
+        isDirectory = isinstance(item, Directory)
+        if self._sortKeyOrder == Qt.AscendingOrder:
+            key = (not isDirectory, value)
+        else:
+            key = (isDirectory, value)
+
+        self._sortKeys[item] = key
+        return key
+
+    def _clearSortKeys(self):
+        '''Clear all cached sort keys.'''
+        self._sortKeys.clear()
+
+    def _clearCaches(self):
+        '''Clear all cached sort keys and filter results.'''
+        self._sortKeys.clear()
+        self._accepted.clear()
+        self._names.clear()
+
+    def _sourceItem(self, index):
+        '''Return item for source *index*, or the source root if invalid.'''
+        if index.isValid():
+            return index.internalPointer()
+
+        return getattr(self.sourceModel(), 'root', None)
+
+    def _discardAccepted(self, parent):
+        '''Discard cached filter results for children of source *parent*.'''
+        item = self._sourceItem(parent)
+        self._accepted.pop(item, None)
+        self._names.pop(item, None)
+
+    def _onSourceDataChanged(self, topLeft, bottomRight):
+        '''Update cached sort keys and filter results for changed rows.'''
+        parent = topLeft.parent()
         sourceModel = self.sourceModel()
-        if sourceModel:
-            leftItem = sourceModel.item(left)
-            rightItem = sourceModel.item(right)
 
-            if (isinstance(leftItem, Directory)
-                and not isinstance(rightItem, Directory)):
-                return self.sortOrder() == Qt.AscendingOrder
+        parentItem = self._sourceItem(parent)
+        accepted = self._accepted.get(parentItem)
+        names = self._names.get(parentItem)
+
+        for row in range(topLeft.row(), bottomRight.row() + 1):
+            item = sourceModel.index(row, 0, parent).internalPointer()
+            self._sortKeys.pop(item, None)
+
+            if names is not None and row < len(names):
+                names[row] = item.name
+
+            if accepted is not None and row < len(accepted):
+                accepted[row] = self._filter(item)
 
-            elif (not isinstance(leftItem, Directory)
-                and isinstance(rightItem, Directory)):
-                return self.sortOrder() == Qt.DescendingOrder
+    def _onSourceRowsAboutToBeInserted(self, parent, start, end):
+        '''Discard cached filter results invalidated by inserted rows.'''
+        item = self._sourceItem(parent)
 
-        return super(FilesystemSortProxy, self).lessThan(left, right)
+        names = self._names.get(item)
+        if names is not None and start < len(names):
+            # Only appended rows can extend existing results.
+            self._discardAccepted(parent)
+            return
+
+        accepted = self._accepted.get(item)
+        if accepted is not None and start < len(accepted):
+            del self._accepted[item]
+
+    def _onSourceRowsAboutToBeRemoved(self, parent, start, end):
+        '''Discard cached data for source rows being removed.'''
+        self._discardAccepted(parent)
+
+        if not self._sortKeys and not self._accepted and not self._names:
+            return
+
+        sourceModel = self.sourceModel()
+        pending = []
+        for row in range(start, end + 1):
+            pending.append(sourceModel.index(row, 0, parent).internalPointer())
+
+        while pending:
+            item = pending.pop()
+            self._sortKeys.pop(item, None)
+            self._accepted.pop(item, None)
+            self._names.pop(item, None)
+            pending.extend(item.children)
 
     @property
     def root(self):
@@ -584,3 +1980,90 @@ class FilesystemSortProxy(QSortFilterProxyModel):
             return False
 
         return sourceModel.fetchMore(self.mapToSource(index))
+
+    def fetchAll(self, index):
+        '''Fetch all remaining data under *index*, blocking until complete.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return False
+
+        return sourceModel.fetchAll(self.mapToSource(index))
+
+    def ensurePathLoaded(self, path):
+        '''Fetch every directory leading to *path* and return its index.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return QModelIndex()
+
+        return self.mapFromSource(sourceModel.ensurePathLoaded(path))
+
+    def prefetch(self, index):
+        '''List children of *index* in the background at low priority.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return
+
+        return sourceModel.prefetch(self.mapToSource(index))
+
+    def setActivePath(self, path):
+        '''Set active *path* whose items are never evicted.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return
+
+        return sourceModel.setActivePath(path)
+
+    def cancelPrefetches(self, keep=None):
+        '''Cancel pending prefetches except for indexes in *keep*.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return
+
+        if keep is not None:
+            keep = [self.mapToSource(index) for index in keep]
+
+        return sourceModel.cancelPrefetches(keep)
+
+    def refresh(self, index=None, recursive=False):
+        '''Update children of *index* to match the filesystem.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return
+
+        if index is not None:
+            index = self.mapToSource(index)
+
+        return sourceModel.refresh(index, recursive=recursive)
+
+    def isLoading(self, index):
+        '''Return whether children of *index* are being fetched.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return False
+
+        return sourceModel.isLoading(self.mapToSource(index))
+
+    def cancelFetch(self, index):
+        '''Cancel pending asynchronous fetch under *index*.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return
+
+        return sourceModel.cancelFetch(self.mapToSource(index))
+
+    def cancelFetches(self, path=None):
+        '''Cancel pending asynchronous fetches not on *path*.'''
+        sourceModel = self.sourceModel()
+
+        if not sourceModel:
+            return
+
+        return sourceModel.cancelFetches(path)
@@ -0,0 +1,239 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import re
+import time
+import select
+import threading
+from collections import namedtuple
+
+
+#: Path of the mount table of the current process.
+MOUNT_INFO_PATH = '/proc/self/mountinfo'
+
+#: Filesystem types that provide kernel interfaces or transient storage rather
+#: than files to browse. Mount points of these types are not listed by
+#: :py:class:`riffle.core.Computer`.
+VIRTUAL_FILESYSTEM_TYPES = frozenset([
+    'proc', 'sysfs', 'devtmpfs', 'devpts', 'tmpfs', 'ramfs', 'cgroup',
+    'cgroup2', 'securityfs', 'pstore', 'debugfs', 'tracefs', 'mqueue',
+    'hugetlbfs', 'configfs', 'fusectl', 'bpf', 'autofs', 'binfmt_misc',
+    'rpc_pipefs', 'nsfs', 'efivarfs', 'selinuxfs', 'squashfs', 'nfsd'
+])
+
+#: Record describing a mounted filesystem.
+#:
+#: *path* is the mount point, *type* the filesystem type and *source* the
+#: mounted device or remote location.
+MountPoint = namedtuple('MountPoint', ['path', 'type', 'source'])
+
+#: Record of the capacity of a filesystem in bytes.
+Capacity = namedtuple('Capacity', ['total', 'free'])
+
+
+def _unescape(value):
+    '''Return *value* from mount table with octal escapes decoded.'''
+    return re.sub(
+        r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), value
+    )
+
+
+def parseMountInfo(data):
+    '''Return list of :py:class:`MountPoint` parsed from mountinfo *data*.
+
+    *data* should be the contents of a ``/proc/<pid>/mountinfo`` file. Where
+    filesystems are mounted over one another only the last mounted, which is
+    the one visible, is returned for the mount point.
+
+    '''
+    mounts = {}
+
+    for line in data.splitlines():
+        fields = line.split()
+
+        # Optional fields are terminated by a single hyphen.
+        try:
+            separator = fields.index('-', 6)
+        except ValueError:
+            continue
+
+        if len(fields) < separator + 3:
+            continue
+
+        path = _unescape(fields[4])
+        mounts[path] = MountPoint(
+            path, fields[separator + 1], _unescape(fields[separator + 2])
+        )
+
+    return sorted(mounts.values())
+
+
+def capacity(path):
+    '''Return :py:class:`Capacity` of filesystem containing *path*.
+
+    Return None if the capacity cannot be determined.
+
+    '''
+    try:
+        result = os.statvfs(path)
+    except (AttributeError, OSError):
+        return None
+
+    return Capacity(
+        result.f_blocks * result.f_frsize, result.f_bavail * result.f_frsize
+    )
+
+
+class MountTable(object):
+    '''Table of mounted filesystems.
+
+    The table is read once and cached. The kernel signals changes to the
+    mount table with an exceptional condition on an open handle to it, which
+    is checked at most once per :py:attr:`checkInterval` seconds before the
+    table is used, so lookups do not otherwise query the system.
+
+    The table is only available on Linux. Elsewhere it is empty and
+    :py:meth:`isAvailable` returns False.
+
+    The table may be safely used from multiple threads.
+
+    '''
+
+    def __init__(self, path=MOUNT_INFO_PATH, checkInterval=1.0):
+        '''Initialise table read from *path*.
+
+        *checkInterval* is the minimum time in seconds between checks for
+        changes to the table.
+
+        '''
+        super(MountTable, self).__init__()
+        self.path = path
+        self.checkInterval = checkInterval
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._poll = None
+        self._checked = None
+
+        self._mounts = []
+        self._paths = frozenset()
+        self._containing = []
+
+        try:
+            self._file = open(path)
+        except (IOError, OSError):
+            return
+
+        if hasattr(select, 'poll'):
+            self._poll = select.poll()
+            self._poll.register(
+                self._file.fileno(), select.POLLPRI | select.POLLERR
+            )
+
+        self._load()
+
+    def __repr__(self):
+        '''Return representation.'''
+        return '<{0} {1}>'.format(self.__class__.__name__, self.path)
+
+    def isAvailable(self):
+        '''Return whether the mount table could be read.'''
+        return self._file is not None
+
+    def refresh(self, force=False):
+        '''Read table again if it has changed and return whether read.
+
+        If *force* is True then read the table regardless.
+
+        '''
+        with self._lock:
+            if self._file is None:
+                return False
+
+            if not force:
+                now = time.time()
+                if (
+                    self._checked is not None
+                    and now - self._checked < self.checkInterval
+                ):
+                    return False
+
+                self._checked = now
+
+                # Without notification, read the table at each check instead.
+                if self._poll is not None and not self._poll.poll(0):
+                    return False
+
+            self._load()
+            return True
+
+    def mounts(self):
+        '''Return list of :py:class:`MountPoint` ordered by path.'''
+        self.refresh()
+        return list(self._mounts)
+
+    def paths(self):
+        '''Return set of mount point paths.'''
+        self.refresh()
+        return self._paths
+
+    def isMount(self, path):
+        '''Return whether normalised absolute *path* is a mount point.'''
+        self.refresh()
+        return path in self._paths
+
+    def mount(self, path):
+        '''Return :py:class:`MountPoint` containing *path* or None.'''
+        self.refresh()
+        path = os.path.abspath(path)
+
+        for mountPoint in self._containing:
+            if (
+                path == mountPoint.path
+                or path.startswith(mountPoint.path.rstrip(os.sep) + os.sep)
+            ):
+                return mountPoint
+
+        return None
+
+    def close(self):
+        '''Close handle to the mount table.'''
+        with self._lock:
+            if self._file is not None:
+                if self._poll is not None:
+                    self._poll.unregister(self._file.fileno())
+                    self._poll = None
+
+                self._file.close()
+                self._file = None
+
+    def _load(self):
+        '''Read table from open handle.'''
+        self._file.seek(0)
+        mounts = parseMountInfo(self._file.read())
+
+        self._mounts = mounts
+        self._paths = frozenset(mountPoint.path for mountPoint in mounts)
+
+        # Longest mount points first so that the first match for a path is
+        # the mount containing it.
+        self._containing = sorted(
+            mounts, key=lambda mountPoint: len(mountPoint.path), reverse=True
+        )
+
+
+_table = None
+_tableLock = threading.Lock()
+
+
+def table():
+    '''Return shared :py:class:`MountTable` for the current process.'''
+    global _table
+
+    with _tableLock:
+        if _table is None:
+            _table = MountTable()
+
+    return _table
@@ -0,0 +1,97 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+from PySide import QtCore
+
+
+class PrefetchScheduler(QtCore.QObject):
+    '''Prefetch directories likely to be opened next.
+
+    Given the current index of a view, the directory at that index, its
+    nearest siblings and its parent chain are prefetched (in that order of
+    priority) using :py:meth:`riffle.model.Filesystem.prefetch`. Prefetches
+    of directories that are no longer candidates are cancelled.
+
+    Scheduling is delayed slightly so that rapidly moving through a listing
+    only prefetches around where the cursor comes to rest.
+
+    '''
+
+    def __init__(self, model, parent=None, radius=3, delay=150):
+        '''Initialise scheduler for *model*.
+
+        *model* should be a :py:class:`riffle.model.Filesystem` or a proxy
+        providing the same prefetch interface, such as
+        :py:class:`riffle.model.FilesystemSortProxy`.
+
+        *parent* is the optional owner of the scheduler.
+
+        *radius* is the number of siblings either side of the current index
+        to prefetch.
+
+        *delay* is the time in milliseconds to wait after the current index
+        changes before prefetching.
+
+        '''
+        super(PrefetchScheduler, self).__init__(parent=parent)
+        self.model = model
+        self.radius = radius
+
+        self._pending = None
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self._onTimeout)
+
+    def schedule(self, index):
+        '''Schedule prefetching around *index*.'''
+        if not index.isValid():
+            return
+
+        self._pending = QtCore.QPersistentModelIndex(index)
+        self._timer.start()
+
+    def cancel(self):
+        '''Cancel scheduled and pending prefetches.'''
+        self._timer.stop()
+        self._pending = None
+        self.model.cancelPrefetches()
+
+    def candidates(self, index):
+        '''Return list of indexes to prefetch for *index* by priority.'''
+        model = self.model
+        index = model.index(index.row(), 0, index.parent())
+        parent = index.parent()
+        row = index.row()
+        rowCount = model.rowCount(parent)
+
+        candidates = [index]
+
+        for distance in range(1, self.radius + 1):
+            for sibling in (row + distance, row - distance):
+                if 0 <= sibling < rowCount:
+                    candidates.append(model.index(sibling, 0, parent))
+
+        while parent.isValid():
+            candidates.append(parent)
+            parent = parent.parent()
+
+        return candidates
+
+    def _onTimeout(self):
+        '''Prefetch around pending index.'''
+        pending = self._pending
+        self._pending = None
+
+        if pending is None or not pending.isValid():
+            return
+
+        candidates = self.candidates(
+            self.model.index(pending.row(), 0, pending.parent())
+        )
+
+        self.model.cancelPrefetches(keep=candidates)
+        for index in candidates:
+            self.model.prefetch(index)
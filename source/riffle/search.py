@@ -0,0 +1,605 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import re
+import time
+import fnmatch
+import threading
+
+try:
+    import queue
+except ImportError:
+    # Python 2.
+    import Queue as queue
+
+from PySide.QtCore import (
+    Qt, QAbstractItemModel, QModelIndex, QObject, QRunnable, QThreadPool,
+    Signal
+)
+
+import riffle.core
+import riffle.model
+
+
+def compileQuery(pattern, caseSensitive=False):
+    '''Return predicate matching names against *pattern*.
+
+    *pattern* is a glob style pattern (supporting ``*``, ``?`` and ``[]``).
+    If it contains no wildcards it matches any name containing it.
+
+    The returned callable accepts a name and returns whether it matches. Its
+    ``matchesMembers`` attribute indicates whether the pattern can match the
+    name of a collection member without also matching the collection
+    pattern, in which case :py:func:`matches` must test member names.
+
+    '''
+    if not any(character in pattern for character in '*?['):
+        pattern = '*{0}*'.format(pattern)
+
+    flags = 0
+    if not caseSensitive:
+        flags = re.IGNORECASE
+
+    expression = re.compile(fnmatch.translate(pattern), flags)
+
+    def predicate(name):
+        '''Return whether *name* matches.'''
+        return expression.match(name) is not None
+
+    # Member names only differ from the collection pattern in the digits of
+    # the index. A pattern of literals other than digits and ``*`` cannot
+    # distinguish one index from another, so if it matches any member it
+    # also matches the pattern.
+    predicate.matchesMembers = any(
+        character in pattern for character in '0123456789?['
+    )
+
+    return predicate
+
+
+def matches(item, predicate):
+    '''Return whether *item* matches *predicate*.
+
+    Collections match if their name, their pattern (such as
+    ``render.%04d.exr``) or the name of any of their members matches. Member
+    names are only tested if *predicate* indicates they may match when the
+    pattern does not (see :py:func:`compileQuery`), so typical queries do not
+    depend on the number of members.
+
+    '''
+    if predicate(item.name):
+        return True
+
+    if isinstance(item, riffle.core.Collection):
+        collection = item._collection
+        if predicate(
+            os.path.basename(collection.format('{head}{padding}{tail}'))
+        ):
+            return True
+
+        if not getattr(predicate, 'matchesMembers', True):
+            return False
+
+        head = os.path.basename(collection.head)
+        tail = collection.tail
+        padding = collection.padding
+        for index in collection.indexes:
+            if predicate('{0}{1:0{2}d}{3}'.format(head, index, padding, tail)):
+                return True
+
+    return False
+
+
+class Index(object):
+    '''Index of items under a root directory.
+
+    Items are recorded per directory as produced by
+    :py:func:`riffle.core.iterItems`, so that collections are indexed by
+    their pattern as well as their members. The index may be safely
+    populated and queried from multiple threads.
+
+    '''
+
+    def __init__(self, root):
+        '''Initialise empty index of directory *root*.'''
+        super(Index, self).__init__()
+        self.root = root
+
+        #: Whether every directory under :py:attr:`root` has been indexed.
+        self.complete = False
+
+        self._lock = threading.Lock()
+        self._directories = {}
+
+    def __repr__(self):
+        '''Return representation.'''
+        return '<{0} {1}>'.format(self.__class__.__name__, self.root)
+
+    def __len__(self):
+        '''Return number of indexed items.'''
+        with self._lock:
+            return sum(len(items) for items in self._directories.values())
+
+    def get(self, directory):
+        '''Return list of items indexed for *directory* or None.'''
+        with self._lock:
+            return self._directories.get(directory)
+
+    def add(self, directory, items):
+        '''Record *items* as the contents of *directory*.'''
+        with self._lock:
+            self._directories[directory] = items
+
+    def discard(self, directory):
+        '''Remove *directory* and its descendants from the index.'''
+        with self._lock:
+            for path in list(self._directories.keys()):
+                if riffle.core._isAncestorPath(directory, path):
+                    del self._directories[path]
+
+            self.complete = False
+
+    def match(self, predicate, path=None):
+        '''Return list of indexed items matching *predicate*.
+
+        If *path* is specified, only return items under *path*.
+
+        '''
+        with self._lock:
+            directories = list(self._directories.items())
+
+        results = []
+        for directory, items in directories:
+            if path is not None and not riffle.core._isAncestorPath(
+                path, directory
+            ):
+                continue
+
+            for item in items:
+                if matches(item, predicate):
+                    results.append(item)
+
+        return results
+
+
+def walk(
+    index, path=None, threadCount=4, cancelled=None, callback=None,
+    crossMounts=False
+):
+    '''Populate *index* by walking directories in parallel.
+
+    Walk *path* (default to the root of *index*) using *threadCount* worker
+    threads. Directories already present in *index* are not listed again but
+    are still descended into. Symbolic links to directories are not followed
+    and mount points are only entered if *crossMounts* is True. Unreadable
+    directories are indexed as empty.
+
+    *cancelled* may be a callable returning True if the walk should stop.
+
+    *callback* may be a callable that will be called with each directory and
+    its items as they become available. It is called from the worker
+    threads.
+
+    Return whether the walk completed.
+
+    '''
+    if path is None:
+        path = index.root
+
+    pending = queue.Queue()
+    pending.put(path)
+
+    errors = []
+
+    def work():
+        '''Process pending directories until told to stop.'''
+        while True:
+            directory = pending.get()
+            try:
+                if directory is None:
+                    return
+
+                if cancelled is not None and cancelled():
+                    continue
+
+                items = index.get(directory)
+                if items is None:
+                    if directory != path and os.path.islink(directory):
+                        continue
+
+                    try:
+                        items = list(
+                            riffle.core.iterItems(
+                                riffle.core.scan(directory)
+                            )
+                        )
+                    except OSError:
+                        items = []
+
+                    index.add(directory, items)
+
+                if callback is not None:
+                    callback(directory, items)
+
+                for item in items:
+                    if isinstance(item, riffle.core.Directory) and (
+                        crossMounts
+                        or not isinstance(item, riffle.core.Mount)
+                    ):
+                        pending.put(item.path)
+
+            except Exception as error:
+                errors.append(error)
+
+            finally:
+                pending.task_done()
+
+    threads = []
+    for _ in range(max(1, threadCount)):
+        thread = threading.Thread(target=work)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    pending.join()
+
+    for thread in threads:
+        pending.put(None)
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    completed = cancelled is None or not cancelled()
+    if completed and path == index.root:
+        index.complete = True
+
+    return completed
+
+
+class _SearchSignals(QObject):
+    '''Signals emitted by a :py:class:`_SearchJob`.'''
+
+    #: Emitted with job and list of matching items.
+    matched = Signal(object, object)
+
+    #: Emitted with job and error (None on success) when job completes.
+    finished = Signal(object, object)
+
+
+class _SearchJob(QRunnable):
+    '''Search an index on a worker thread, walking the tree if required.'''
+
+    #: Maximum interval in seconds between emitting batches of matches.
+    interval = 0.1
+
+    def __init__(
+        self, index, path, predicate, threadCount, batchSize, crossMounts
+    ):
+        '''Initialise job.'''
+        super(_SearchJob, self).__init__()
+        self.setAutoDelete(False)
+
+        self.index = index
+        self.path = path
+        self.predicate = predicate
+        self.threadCount = threadCount
+        self.batchSize = batchSize
+        self.crossMounts = crossMounts
+        self.cancelled = False
+        self.signals = _SearchSignals()
+
+        self._lock = threading.Lock()
+        self._batch = []
+        self._lastEmitted = time.time()
+
+    def run(self):
+        '''Run job.'''
+        error = None
+
+        try:
+            if self.index.complete:
+                self._collect(self.index.match(self.predicate, self.path))
+            else:
+                walk(
+                    self.index, self.path, threadCount=self.threadCount,
+                    cancelled=lambda: self.cancelled,
+                    callback=self._onDirectoryIndexed,
+                    crossMounts=self.crossMounts
+                )
+
+            self._emit(force=True)
+
+        except Exception as exception:
+            error = exception
+
+        self.signals.finished.emit(self, error)
+
+    def _onDirectoryIndexed(self, directory, items):
+        '''Collect matches from *items* of *directory*.'''
+        self._collect(
+            item for item in items if matches(item, self.predicate)
+        )
+
+    def _collect(self, items):
+        '''Add matching *items* to the pending batch.'''
+        with self._lock:
+            self._batch.extend(items)
+
+        self._emit()
+
+    def _emit(self, force=False):
+        '''Emit pending batch if large enough, overdue or *force* is True.'''
+        with self._lock:
+            if not self._batch or self.cancelled:
+                return
+
+            if not force and len(self._batch) < self.batchSize and (
+                time.time() - self._lastEmitted < self.interval
+            ):
+                return
+
+            batch = self._batch
+            self._batch = []
+            self._lastEmitted = time.time()
+
+        for start in range(0, len(batch), self.batchSize):
+            self.signals.matched.emit(
+                self, batch[start:start + self.batchSize]
+            )
+
+
+class SearchModel(QAbstractItemModel):
+    '''Flat model of items matching a search under a root directory.
+
+    The tree under the root is walked by parallel worker threads, recording
+    every directory in an :py:class:`Index`. Matches are added to the model
+    in batches as they are found. The index is retained so that subsequent
+    searches of the same root, or of any directory under it, only need to
+    query the index.
+
+    Example::
+
+        model = SearchModel()
+        model.search('/jobs/show', '*.exr')
+
+    '''
+
+    ITEM_ROLE = riffle.model.Filesystem.ITEM_ROLE
+
+    #: Emitted with searching state when a search starts or stops.
+    searchingChanged = Signal(bool)
+
+    #: Emitted with error when a search fails.
+    searchFailed = Signal(object)
+
+    def __init__(
+        self, parent=None, iconFactory=None, threadCount=4, crossMounts=False
+    ):
+        '''Initialise model.
+
+        *iconFactory* specifies the optional factory used for item icons.
+
+        *threadCount* is the number of worker threads used to walk a tree
+        that has not yet been indexed.
+
+        If *crossMounts* is True then walks descend into other mounted
+        filesystems.
+
+        '''
+        super(SearchModel, self).__init__(parent=parent)
+        self.columns = ['Name', 'Size', 'Type', 'Date Modified', 'Location']
+
+        if iconFactory is None:
+            # Local import to circumvent circular dependency.
+            import riffle.icon_factory
+            iconFactory = riffle.icon_factory.IconFactory()
+
+        self.iconFactory = iconFactory
+        self.threadCount = threadCount
+        self.crossMounts = crossMounts
+        self.batchSize = 500
+
+        self._items = []
+        self._indexes = {}
+        self._job = None
+        self._cancelledJobs = set()
+        self._threadPool = QThreadPool(self)
+
+    def search(self, path, pattern, caseSensitive=False):
+        '''Search for items under directory *path* matching *pattern*.
+
+        *pattern* is interpreted as by :py:func:`compileQuery`. Any current
+        search is cancelled and existing results removed.
+
+        '''
+        self.cancel()
+
+        self.beginResetModel()
+        self._items = []
+        self.endResetModel()
+
+        path = os.path.normpath(path)
+        predicate = compileQuery(pattern, caseSensitive=caseSensitive)
+
+        job = _SearchJob(
+            self.searchIndex(path), path, predicate, self.threadCount,
+            self.batchSize, self.crossMounts
+        )
+        job.signals.matched.connect(self._onMatched)
+        job.signals.finished.connect(self._onFinished)
+
+        self._job = job
+        self.searchingChanged.emit(True)
+        self._threadPool.start(job)
+
+    def searchIndex(self, path):
+        '''Return :py:class:`Index` covering directory *path*.
+
+        A complete index of an ancestor directory is reused if available,
+        otherwise an index of *path* is created if necessary.
+
+        '''
+        for root, index in self._indexes.items():
+            if index.complete and riffle.core._isAncestorPath(root, path):
+                return index
+
+        index = self._indexes.get(path)
+        if index is None:
+            index = Index(path)
+            self._indexes[path] = index
+
+        return index
+
+    def isSearching(self):
+        '''Return whether a search is in progress.'''
+        return self._job is not None
+
+    def cancel(self):
+        '''Cancel search in progress, retaining results found so far.'''
+        job = self._job
+        if job is None:
+            return
+
+        self._job = None
+        job.cancelled = True
+
+        # Keep reference until job completes on its thread.
+        self._cancelledJobs.add(job)
+
+        self.searchingChanged.emit(False)
+
+    def invalidate(self, path=None):
+        '''Discard indexed contents of *path* and its descendants.
+
+        If *path* is not specified, discard all indexes.
+
+        '''
+        if path is None:
+            self._indexes.clear()
+            return
+
+        for index in self._indexes.values():
+            index.discard(path)
+
+    def item(self, index):
+        '''Return item from *index*.'''
+        return self.data(index, role=self.ITEM_ROLE)
+
+    def icon(self, index):
+        '''Return icon for index.'''
+        return self.data(index, role=Qt.DecorationRole)
+
+    def rowCount(self, parent):
+        '''Return number of children *parent* index has.'''
+        if parent.isValid():
+            return 0
+
+        return len(self._items)
+
+    def columnCount(self, parent):
+        '''Return amount of data *parent* index has.'''
+        return len(self.columns)
+
+    def flags(self, index):
+        '''Return flags for *index*.'''
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def index(self, row, column, parent):
+        '''Return index for *row* and *column* under *parent*.'''
+        if parent.isValid():
+            return QModelIndex()
+
+        if row < 0 or row >= len(self._items):
+            return QModelIndex()
+
+        return self.createIndex(row, column, self._items[row])
+
+    def parent(self, index):
+        '''Return parent of *index*.'''
+        return QModelIndex()
+
+    def hasChildren(self, index):
+        '''Return if *index* has children.'''
+        return not index.isValid()
+
+    def data(self, index, role):
+        '''Return data for *index* according to *role*.'''
+        if not index.isValid():
+            return None
+
+        column = index.column()
+        item = index.internalPointer()
+
+        if role == self.ITEM_ROLE:
+            return item
+
+        elif role == Qt.DisplayRole:
+            if column == 0:
+                return item.name
+            elif column == 1:
+                size = item.size
+                if size:
+                    return size
+            elif column == 2:
+                return item.type
+            elif column == 3:
+                modified = item.modified
+                if modified is not None:
+                    return modified.strftime('%c')
+            elif column == 4:
+                return os.path.dirname(item.path)
+
+        elif role == Qt.DecorationRole:
+            if column == 0:
+                return self.iconFactory.icon(item)
+
+        elif role == Qt.TextAlignmentRole:
+            if column == 1:
+                return Qt.AlignRight
+            else:
+                return Qt.AlignLeft
+
+        return None
+
+    def headerData(self, section, orientation, role):
+        '''Return label for *section* according to *orientation* and *role*.'''
+        if orientation == Qt.Horizontal:
+            if section < len(self.columns):
+                column = self.columns[section]
+                if role == Qt.DisplayRole:
+                    return column
+
+        return None
+
+    def _onMatched(self, job, items):
+        '''Add matching *items* found by *job*.'''
+        if job is not self._job:
+            # Cancelled.
+            return
+
+        start = len(self._items)
+        self.beginInsertRows(QModelIndex(), start, start + len(items) - 1)
+        self._items.extend(items)
+        self.endInsertRows()
+
+    def _onFinished(self, job, error):
+        '''Handle completion of *job* with optional *error*.'''
+        self._cancelledJobs.discard(job)
+
+        if job is not self._job:
+            # Cancelled.
+            return
+
+        self._job = None
+        self.searchingChanged.emit(False)
+
+        if error is not None:
+            self.searchFailed.emit(error)
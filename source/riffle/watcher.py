@@ -0,0 +1,214 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+
+from PySide import QtCore
+
+import riffle.mount
+
+
+#: Filesystem types for which native change notification is unreliable and so
+#: polling is used instead.
+NETWORK_FILESYSTEM_TYPES = set([
+    'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'afs', 'ncpfs', 'coda', '9p',
+    'ceph', 'glusterfs', 'lustre', 'gpfs', 'fuse.sshfs', 'fuse.glusterfs',
+    'fuse.ceph'
+])
+
+#: Placeholder signature of a polled directory not yet checked.
+_UNKNOWN = object()
+
+
+def _signature(path):
+    '''Return signature of directory at *path* used to detect changes.'''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_ino, stat.st_mtime)
+
+
+class _PollSignals(QtCore.QObject):
+    '''Signals emitted by a :py:class:`_PollJob`.'''
+
+    #: Emitted with job and dictionary of path to signature.
+    finished = QtCore.Signal(object, object)
+
+
+class _PollJob(QtCore.QRunnable):
+    '''Check signatures of polled directories on a worker thread.'''
+
+    def __init__(self, paths):
+        '''Initialise job to check directories at *paths*.'''
+        super(_PollJob, self).__init__()
+        self.setAutoDelete(False)
+
+        self.paths = paths
+        self.signals = _PollSignals()
+
+    def run(self):
+        '''Run job.'''
+        self.signals.finished.emit(
+            self, dict((path, _signature(path)) for path in self.paths)
+        )
+
+
+class Watcher(QtCore.QObject):
+    '''Watch directories for changes.
+
+    Directories are watched with :py:class:`QtCore.QFileSystemWatcher`, which
+    uses the native notification mechanism of the platform (inotify on Linux).
+    Directories on network filesystems, or that cannot be watched natively
+    (such as when the notification limit has been reached), are instead polled
+    by comparing their modification time at regular intervals.
+
+    Polled directories are checked on a worker thread so that an unresponsive
+    network filesystem does not block the thread the watcher belongs to. A
+    check is skipped whilst the previous check is still in progress.
+
+    '''
+
+    #: Emitted with path of directory when its contents may have changed.
+    directoryChanged = QtCore.Signal(object)
+
+    def __init__(self, parent=None, pollInterval=2000):
+        '''Initialise watcher.
+
+        *parent* is the optional owner of the watcher.
+
+        *pollInterval* is the interval in milliseconds at which polled
+        directories are checked for changes.
+
+        '''
+        super(Watcher, self).__init__(parent=parent)
+
+        self._nativeWatcher = QtCore.QFileSystemWatcher(self)
+        self._nativeWatcher.directoryChanged.connect(self._onNativeChanged)
+
+        self._polled = {}
+        self._pollTimer = QtCore.QTimer(self)
+        self._pollTimer.setInterval(pollInterval)
+        self._pollTimer.timeout.connect(self.poll)
+
+        self._threadPool = QtCore.QThreadPool(self)
+        self._threadPool.setMaxThreadCount(2)
+        self._pollJob = None
+        self._jobs = set()
+
+    @property
+    def pollInterval(self):
+        '''Return interval in milliseconds at which directories are polled.'''
+        return self._pollTimer.interval()
+
+    @pollInterval.setter
+    def pollInterval(self, interval):
+        '''Set *interval* in milliseconds at which directories are polled.'''
+        self._pollTimer.setInterval(interval)
+
+    def paths(self):
+        '''Return list of watched directory paths.'''
+        return list(self._nativeWatcher.directories()) + list(self._polled)
+
+    def watch(self, path, poll=None):
+        '''Watch directory at *path* for changes.
+
+        If *poll* is None then polling is used only when the directory is on a
+        network filesystem or cannot be watched natively. Set *poll* to True
+        or False to force the behaviour.
+
+        '''
+        if path in self._polled:
+            return
+
+        if poll is None:
+            poll = self.isNetworkPath(path)
+
+        if not poll:
+            if path in self._nativeWatcher.directories():
+                return
+
+            self._nativeWatcher.addPath(path)
+            if path in self._nativeWatcher.directories():
+                return
+
+        # Record initial signature in the background to compare against.
+        self._polled[path] = _UNKNOWN
+        self._startPoll([path])
+
+        if not self._pollTimer.isActive():
+            self._pollTimer.start()
+
+    def unwatch(self, path):
+        '''Stop watching directory at *path*.'''
+        if self._polled.pop(path, None) is None:
+            if path in self._nativeWatcher.directories():
+                self._nativeWatcher.removePath(path)
+
+        if not self._polled:
+            self._pollTimer.stop()
+
+    def clear(self):
+        '''Stop watching all directories.'''
+        directories = self._nativeWatcher.directories()
+        if directories:
+            self._nativeWatcher.removePaths(directories)
+
+        self._polled.clear()
+        self._pollTimer.stop()
+
+    def isNetworkPath(self, path):
+        '''Return whether *path* is on a network filesystem.'''
+        mountPoint = riffle.mount.table().mount(path)
+        if mountPoint is None:
+            return False
+
+        return mountPoint.type in NETWORK_FILESYSTEM_TYPES
+
+    def poll(self):
+        '''Start checking polled directories for changes.
+
+        :py:attr:`directoryChanged` is emitted for changed directories once
+        the check completes.
+
+        '''
+        if self._pollJob is not None or not self._polled:
+            return
+
+        self._pollJob = self._startPoll(list(self._polled))
+
+    def _startPoll(self, paths):
+        '''Start and return job checking directories at *paths*.'''
+        job = _PollJob(paths)
+        job.signals.finished.connect(self._onPollFinished)
+
+        # Keep reference until job completes on its thread.
+        self._jobs.add(job)
+        self._threadPool.start(job)
+
+        return job
+
+    def _onPollFinished(self, job, signatures):
+        '''Emit change for directories whose *signatures* changed.'''
+        self._jobs.discard(job)
+        if job is self._pollJob:
+            self._pollJob = None
+
+        for path, currentSignature in signatures.items():
+            if path not in self._polled:
+                # No longer watched.
+                continue
+
+            signature = self._polled[path]
+            if signature == currentSignature:
+                continue
+
+            self._polled[path] = currentSignature
+            if signature is not _UNKNOWN:
+                self.directoryChanged.emit(path)
+
+    def _onNativeChanged(self, path):
+        '''Handle native notification of change to *path*.'''
+        self.directoryChanged.emit(path)
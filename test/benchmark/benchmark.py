@@ -0,0 +1,662 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Benchmark model listing, sorting and path resolution.
+
+Synthetic trees are created under a working directory (reused between runs)
+and each benchmark reports its best time, throughput, peak Python memory and
+filesystem call counts as JSON::
+
+    python test/benchmark/benchmark.py --output results.json
+    python test/benchmark/benchmark.py --compare results.json
+
+Use ``--core`` to only benchmark :py:mod:`riffle.core`, which does not
+require Qt.
+
+The time to import each module in a fresh interpreter is also measured and
+checked against a budget (see :py:data:`IMPORT_BUDGETS`). The exit status is
+non-zero if any budget is exceeded.
+
+'''
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import platform
+import importlib
+import tempfile
+import functools
+import subprocess
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python < 3.4.
+    tracemalloc = None
+
+import riffle
+import riffle.core
+
+# Qt and the model are imported when required so that the core can be
+# benchmarked without Qt.
+QtCore = None
+QtGui = None
+
+
+#: Suffix of file, alongside a tree, marking it as completely generated.
+MARKER_SUFFIX = '.complete'
+
+#: Maximum time in seconds to import each module in a fresh interpreter, in
+#: order of import. Modules marked as requiring Qt are not measured with
+#: ``--core``.
+IMPORT_BUDGETS = [
+    ('riffle', 0.005, False),
+    ('riffle.core', 0.05, False),
+    ('riffle.cache', 0.05, False),
+    ('riffle.model', 0.5, True),
+    ('riffle.browser', 0.5, True)
+]
+
+#: Script run in a fresh interpreter to time importing a module.
+IMPORT_SCRIPT = '''
+import sys, json, timeit
+before = set(sys.modules)
+start = timeit.default_timer()
+__import__({0!r})
+seconds = timeit.default_timer() - start
+loaded = set(sys.modules) - before
+print(json.dumps({{
+    'seconds': seconds,
+    'modules': len(loaded),
+    'qt': 'PySide' in loaded,
+    'resource': 'riffle.resource' in loaded
+}}))
+'''
+
+
+def createFlat(path, count):
+    '''Create directory at *path* containing *count* files.'''
+    os.makedirs(path)
+    for index in range(count):
+        open(os.path.join(path, 'file_{0:07d}.dat'.format(index)), 'w').close()
+
+
+def createDeep(path, depth, filesPerLevel=10):
+    '''Create *depth* nested directories under *path*.
+
+    Each level contains *filesPerLevel* files. Return deepest directory.
+
+    '''
+    current = path
+    for level in range(depth):
+        current = os.path.join(current, 'level_{0:03d}'.format(level))
+        os.makedirs(current)
+        for index in range(filesPerLevel):
+            open(
+                os.path.join(current, 'file_{0:03d}.dat'.format(index)), 'w'
+            ).close()
+
+    return current
+
+
+def createSequences(path, sequences, frames):
+    '''Create *sequences* frame sequences of *frames* each under *path*.
+
+    A file not belonging to any sequence is added for every 100 frames.
+
+    '''
+    os.makedirs(path)
+    for sequence in range(sequences):
+        for frame in range(1, frames + 1):
+            open(
+                os.path.join(
+                    path, 'shot_{0:03d}.{1:04d}.exr'.format(sequence, frame)
+                ),
+                'w'
+            ).close()
+
+            if frame % 100 == 0:
+                open(
+                    os.path.join(
+                        path, 'notes_{0:03d}_{1:04d}.txt'.format(
+                            sequence, frame
+                        )
+                    ),
+                    'w'
+                ).close()
+
+
+def prepare(root, sizes, depth, sequences, frames):
+    '''Create synthetic trees under *root* if not already present.
+
+    Return mapping of tree name to (path, number of entries).
+
+    '''
+    trees = {}
+
+    for size in sizes:
+        path = os.path.join(root, 'flat_{0}'.format(size))
+        trees['flat_{0}'.format(size)] = (path, size)
+        if not os.path.exists(path + MARKER_SUFFIX):
+            if os.path.exists(path):
+                raise RuntimeError(
+                    'Incomplete tree at {0}. Remove it and run again.'
+                    .format(path)
+                )
+
+            createFlat(path, size)
+            open(path + MARKER_SUFFIX, 'w').close()
+
+    path = os.path.join(root, 'deep_{0}'.format(depth))
+    trees['deep_{0}'.format(depth)] = (path, depth * 11)
+    if not os.path.exists(path + MARKER_SUFFIX):
+        os.makedirs(path)
+        createDeep(path, depth)
+        open(path + MARKER_SUFFIX, 'w').close()
+
+    name = 'sequences_{0}x{1}'.format(sequences, frames)
+    path = os.path.join(root, name)
+    trees[name] = (path, sequences * frames + sequences * (frames // 100))
+    if not os.path.exists(path + MARKER_SUFFIX):
+        createSequences(path, sequences, frames)
+        open(path + MARKER_SUFFIX, 'w').close()
+
+    return trees
+
+
+class SyscallCounter(object):
+    '''Count filesystem calls made through :py:mod:`os` and scandir.
+
+    Calls are counted by temporarily wrapping the functions used by riffle.
+    Stat calls made through :py:class:`os.DirEntry` are counted on first use
+    per entry, matching when a system call is made.
+
+    '''
+
+    #: Names of functions in :py:mod:`os` to wrap.
+    FUNCTIONS = ('stat', 'lstat', 'listdir')
+
+    def __init__(self):
+        '''Initialise counter.'''
+        self.counts = {}
+        self._originals = {}
+
+    def __enter__(self):
+        '''Start counting.'''
+        for name in self.FUNCTIONS:
+            original = getattr(os, name)
+            self._originals[(os, name)] = original
+            setattr(os, name, self._wrap(name, original))
+
+        original = riffle.core.scandir
+        self._originals[(riffle.core, 'scandir')] = original
+        riffle.core.scandir = self._wrapScandir(original)
+
+        return self
+
+    def __exit__(self, *args):
+        '''Stop counting.'''
+        for (module, name), original in self._originals.items():
+            setattr(module, name, original)
+
+        self._originals.clear()
+
+    def _increment(self, name):
+        '''Increment count for *name*.'''
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _wrap(self, name, function):
+        '''Return *function* wrapped to count calls as *name*.'''
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self._increment(name)
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    def _wrapScandir(self, function):
+        '''Return scandir *function* wrapped to count calls.'''
+        counter = self
+
+        class Entry(object):
+            '''Proxy to directory entry counting stat calls.'''
+
+            def __init__(self, entry):
+                self._entry = entry
+                self._stats = set()
+
+            def __getattr__(self, name):
+                return getattr(self._entry, name)
+
+            def stat(self, follow_symlinks=True):
+                if follow_symlinks not in self._stats:
+                    self._stats.add(follow_symlinks)
+                    counter._increment('entry.stat')
+
+                return self._entry.stat(follow_symlinks=follow_symlinks)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            counter._increment('scandir')
+            for entry in function(*args, **kwargs):
+                yield Entry(entry)
+
+        return wrapper
+
+
+def measure(name, parameters, items, setup, operation, repeat):
+    '''Return result of benchmarking *operation*.
+
+    *setup* is called before each run and its result passed to *operation*.
+    *items* is the number of items processed by one run, used to compute
+    throughput.
+
+    Timings use the best of *repeat* runs. Memory and filesystem calls are
+    measured in separate runs so as not to affect timings.
+
+    '''
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start = time.time()
+        operation(state)
+        timings.append(time.time() - start)
+
+    seconds = min(timings)
+
+    peakMemory = None
+    if tracemalloc is not None:
+        state = setup()
+        gc.collect()
+        tracemalloc.start()
+        operation(state)
+        peakMemory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    state = setup()
+    with SyscallCounter() as counter:
+        operation(state)
+
+    return {
+        'name': name,
+        'parameters': parameters,
+        'items': items,
+        'seconds': seconds,
+        'throughput': items / seconds if seconds else None,
+        'peakMemory': peakMemory,
+        'syscalls': counter.counts
+    }
+
+
+def fetchAll(model, index):
+    '''Fetch all children of *index* in batches as a view would.'''
+    while model.canFetchMore(index):
+        model.fetchMore(index)
+
+
+def loadedModel(path):
+    '''Return model rooted at *path* with all children fetched.'''
+    model = riffle.model.Filesystem(path=path)
+    fetchAll(model, QtCore.QModelIndex())
+    return model
+
+
+def benchmarkFetchChildren(path, entries, repeat):
+    '''Benchmark listing directory at *path* with *entries* entries.'''
+    return measure(
+        'Directory._fetchChildren', {'path': os.path.basename(path)},
+        entries,
+        lambda: riffle.core.Directory(path),
+        lambda item: item._fetchChildren(),
+        repeat
+    )
+
+
+def benchmarkFetchMore(path, entries, repeat):
+    '''Benchmark populating model rooted at *path* using fetchMore.'''
+    return measure(
+        'Filesystem.fetchMore', {'path': os.path.basename(path)},
+        entries,
+        lambda: riffle.model.Filesystem(path=path),
+        lambda model: fetchAll(model, QtCore.QModelIndex()),
+        repeat
+    )
+
+
+def benchmarkDeepPathIndex(root, deepest, repeat, lookups=1000):
+    '''Benchmark resolving *deepest* path under *root*.'''
+    def setup():
+        '''Return model with path to *deepest* fetched.'''
+        model = loadedModel(root)
+        current = root
+        for part in os.path.relpath(deepest, root).split(os.sep):
+            current = os.path.join(current, part)
+            fetchAll(model, model.pathIndex(current))
+
+        return model
+
+    def operation(model):
+        '''Resolve path repeatedly.'''
+        for _ in range(lookups):
+            model.pathIndex(deepest)
+
+    return measure(
+        'Filesystem.pathIndex',
+        {'path': os.path.basename(root), 'depth': deepest.count(os.sep)},
+        lookups, setup, operation, repeat
+    )
+
+
+def benchmarkFlatPathIndex(path, repeat, lookups=1000):
+    '''Benchmark resolving file paths in directory at *path*.'''
+    model = loadedModel(path)
+    names = [
+        item.path for item in model.root.children
+        if isinstance(item, riffle.core.File)
+    ]
+    sample = random.Random(0).sample(names, min(lookups, len(names)))
+
+    def operation(model):
+        '''Resolve sampled paths.'''
+        for samplePath in sample:
+            model.pathIndex(samplePath)
+
+    return measure(
+        'Filesystem.pathIndex', {'path': os.path.basename(path)},
+        len(sample), lambda: model, operation, repeat
+    )
+
+
+def benchmarkSort(path, entries, column, repeat):
+    '''Benchmark sorting directory at *path* by *column* via proxy.'''
+    model = loadedModel(path)
+
+    def setup():
+        '''Return proxy for model with top level mapped.'''
+        proxy = riffle.model.FilesystemSortProxy()
+        proxy.setSourceModel(model)
+        proxy.rowCount(QtCore.QModelIndex())
+        return proxy
+
+    return measure(
+        'FilesystemSortProxy.sort',
+        {'path': os.path.basename(path), 'column': column},
+        entries, setup,
+        lambda proxy: proxy.sort(column, QtCore.Qt.AscendingOrder),
+        repeat
+    )
+
+
+def benchmarkData(path, column, repeat):
+    '''Benchmark retrieving display data for *column* of all rows.'''
+    model = loadedModel(path)
+    rows = model.rowCount(QtCore.QModelIndex())
+
+    def operation(model):
+        '''Retrieve data for every row.'''
+        parent = QtCore.QModelIndex()
+        for row in range(rows):
+            model.data(model.index(row, column, parent), QtCore.Qt.DisplayRole)
+
+    return measure(
+        'Filesystem.data', {'path': os.path.basename(path), 'column': column},
+        rows, lambda: model, operation, repeat
+    )
+
+
+def benchmarkFilter(path, entries, repeat):
+    '''Benchmark evaluating a filter over listing of directory at *path*.'''
+    items = riffle.core.Directory(path)._fetchChildren()
+    filter = riffle.core.Filter(pattern='*1*', types=['File', 'Collection'])
+
+    return measure(
+        'Filter.evaluate', {'path': os.path.basename(path)},
+        len(items), lambda: items, filter.evaluate, repeat
+    )
+
+
+def benchmarkImport(module, budget, repeat):
+    '''Benchmark importing *module* in a fresh interpreter.
+
+    The best time of *repeat* imports is compared against *budget* seconds.
+
+    '''
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        path for path in sys.path if path
+    )
+
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', IMPORT_SCRIPT.format(module)],
+            env=environment
+        )
+        sample = json.loads(output.decode('utf-8'))
+        if best is None or sample['seconds'] < best['seconds']:
+            best = sample
+
+    seconds = best['seconds']
+
+    return {
+        'name': 'import',
+        'parameters': {'module': module},
+        'items': 1,
+        'seconds': seconds,
+        'throughput': 1.0 / seconds if seconds else None,
+        'peakMemory': None,
+        'syscalls': {},
+        'modules': best['modules'],
+        'qt': best['qt'],
+        'resource': best['resource'],
+        'budget': budget,
+        'withinBudget': seconds <= budget
+    }
+
+
+def runImports(repeat, budgets=None, core=False):
+    '''Run import benchmarks and return list of results.
+
+    *budgets* may be a mapping of module name to budget in seconds overriding
+    :py:data:`IMPORT_BUDGETS`. If *core* is True then modules requiring Qt
+    are skipped.
+
+    '''
+    budgets = budgets or {}
+    results = []
+
+    for module, budget, requiresQt in IMPORT_BUDGETS:
+        if core and requiresQt:
+            continue
+
+        results.append(
+            benchmarkImport(module, budgets.get(module, budget), repeat)
+        )
+
+    return results
+
+
+def run(trees, depth, repeat, core=False):
+    '''Run all benchmarks against *trees* and return list of results.
+
+    If *core* is True then only run benchmarks of :py:mod:`riffle.core`.
+
+    '''
+    results = []
+
+    for name, (path, entries) in sorted(trees.items()):
+        if name.startswith('deep_'):
+            continue
+
+        results.append(benchmarkFetchChildren(path, entries, repeat))
+        results.append(benchmarkFilter(path, entries, repeat))
+
+        if core:
+            continue
+
+        results.append(benchmarkFetchMore(path, entries, repeat))
+
+        if name.startswith('flat_'):
+            results.append(benchmarkFlatPathIndex(path, repeat))
+
+        for column in range(4):
+            results.append(benchmarkSort(path, entries, column, repeat))
+            results.append(benchmarkData(path, column, repeat))
+
+    if core:
+        return results
+
+    path, _ = trees['deep_{0}'.format(depth)]
+    deepest = path
+    for level in range(depth):
+        deepest = os.path.join(deepest, 'level_{0:03d}'.format(level))
+
+    results.append(benchmarkDeepPathIndex(path, deepest, repeat))
+
+    return results
+
+
+def compare(results, baseline):
+    '''Return list of lines comparing throughput of *results* to *baseline*.'''
+    def key(result):
+        '''Return key identifying *result*.'''
+        return (
+            result['name'], json.dumps(result['parameters'], sort_keys=True)
+        )
+
+    previous = dict((key(result), result) for result in baseline['results'])
+
+    lines = []
+    for result in results:
+        other = previous.get(key(result))
+        if other is None or not other['throughput']:
+            continue
+
+        lines.append(
+            '{0} {1}: {2:.2f}x throughput'.format(
+                result['name'], key(result)[1],
+                result['throughput'] / other['throughput']
+            )
+        )
+
+    return lines
+
+
+def main(arguments=None):
+    '''Run benchmarks and output results as JSON.'''
+    if arguments is None:
+        arguments = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--root', default=os.path.join(
+            tempfile.gettempdir(), 'riffle_benchmark'
+        ),
+        help='Directory in which to create (or reuse) synthetic trees.'
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+        help='Number of files in each flat directory (up to 500000).'
+    )
+    parser.add_argument(
+        '--depth', type=int, default=100, help='Depth of nested tree.'
+    )
+    parser.add_argument(
+        '--sequences', type=int, default=10,
+        help='Number of frame sequences.'
+    )
+    parser.add_argument(
+        '--frames', type=int, default=10000,
+        help='Number of frames per sequence.'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of timed runs per benchmark.'
+    )
+    parser.add_argument(
+        '--output', help='File to write results to instead of stdout.'
+    )
+    parser.add_argument(
+        '--compare', metavar='BASELINE',
+        help='Results file to compare throughput against.'
+    )
+    parser.add_argument(
+        '--core', action='store_true',
+        help='Only benchmark riffle.core, without importing Qt.'
+    )
+    parser.add_argument(
+        '--import-budget', metavar='MODULE=SECONDS', action='append',
+        default=[], help='Override import time budget for a module.'
+    )
+    namespace = parser.parse_args(arguments)
+
+    budgets = {}
+    for override in namespace.import_budget:
+        module, _, seconds = override.partition('=')
+        budgets[module] = float(seconds)
+
+    # Measure imports first as they run in separate interpreters.
+    imports = runImports(namespace.repeat, budgets, core=namespace.core)
+
+    if not namespace.core:
+        global QtCore, QtGui
+        from PySide import QtCore, QtGui
+        importlib.import_module('riffle.model')
+
+        # GUI is not required but models rely on an application instance.
+        application = QtGui.QApplication.instance()
+        if application is None:
+            application = QtGui.QApplication(sys.argv[:1], False)
+
+    trees = prepare(
+        namespace.root, namespace.sizes, namespace.depth,
+        namespace.sequences, namespace.frames
+    )
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'riffle': riffle.__version__,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': imports + run(
+            trees, namespace.depth, namespace.repeat, core=namespace.core
+        )
+    }
+
+    output = json.dumps(report, indent=4, sort_keys=True)
+    if namespace.output:
+        with open(namespace.output, 'w') as outputFile:
+            outputFile.write(output)
+    else:
+        print(output)
+
+    if namespace.compare:
+        with open(namespace.compare) as baselineFile:
+            baseline = json.load(baselineFile)
+
+        for line in compare(report['results'], baseline):
+            sys.stderr.write(line + '\n')
+
+    exceeded = [result for result in imports if not result['withinBudget']]
+    for result in exceeded:
+        sys.stderr.write(
+            'Importing {0} took {1:.3f}s, exceeding budget of {2:.3f}s.\n'
+            .format(
+                result['parameters']['module'], result['seconds'],
+                result['budget']
+            )
+        )
+
+    return 1 if exceeded else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import sqlite3
+
+import pytest
+
+import riffle.core
+import riffle.cache
+
+
+@pytest.fixture()
+def entries():
+    '''Return entries of a listing of each kind.'''
+    return [
+        riffle.core.Entry('/render/a.0001.exr', riffle.core.FILE, 10, 1.5),
+        riffle.core.Entry('/render/shots', riffle.core.DIRECTORY, 4096, 2.0),
+        riffle.core.Entry('/render/mnt', riffle.core.MOUNT, 0, 3.25)
+    ]
+
+
+def test_round_trip(entries):
+    '''Return stored listing.'''
+    cache = riffle.cache.ListingCache(':memory:')
+    assert cache.get('/render') is None
+    assert '/render' not in cache
+
+    cache.set('/render', 100.5, entries)
+    assert '/render' in cache
+    assert cache.get('/render') == (100.5, entries)
+
+    cache.set('/render', 200.0, entries[:1])
+    assert cache.get('/render') == (200.0, entries[:1])
+
+    cache.discard('/render')
+    assert cache.get('/render') is None
+
+    cache.set('/render', 100.5, entries)
+    cache.clear()
+    assert '/render' not in cache
+
+    cache.close()
+
+
+def test_persisted(tmpdir, entries):
+    '''Return listing stored by a previous instance.'''
+    path = str(tmpdir.join('nested', 'listing.db'))
+
+    cache = riffle.cache.ListingCache(path)
+    cache.set('/render', 100.5, entries)
+    cache.close()
+
+    cache = riffle.cache.ListingCache(path)
+    assert cache.get('/render') == (100.5, entries)
+    cache.close()
+
+
+def test_schema_version_reset(tmpdir, entries):
+    '''Discard listings stored with a different schema version.'''
+    path = str(tmpdir.join('listing.db'))
+
+    cache = riffle.cache.ListingCache(path)
+    cache.set('/render', 100.5, entries)
+    cache.close()
+
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'PRAGMA user_version = {0}'.format(riffle.cache.SCHEMA_VERSION + 1)
+    )
+    connection.commit()
+    connection.close()
+
+    cache = riffle.cache.ListingCache(path)
+    assert cache.get('/render') is None
+
+    cache.set('/render', 100.5, entries)
+    assert cache.get('/render') == (100.5, entries)
+    cache.close()
+
+    connection = sqlite3.connect(path)
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    connection.close()
+    assert version == riffle.cache.SCHEMA_VERSION
+
+
+def test_update(entries):
+    '''Store multiple listings at once.'''
+    cache = riffle.cache.ListingCache(':memory:')
+    cache.set('/render', 1.0, entries)
+
+    cache.update([
+        ('/render', 2.0, entries[1:]),
+        ('/other', 3.0, [])
+    ])
+    assert cache.get('/render') == (2.0, entries[1:])
+    assert cache.get('/other') == (3.0, [])
+
+    cache.close()
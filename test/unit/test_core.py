@@ -0,0 +1,489 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import random
+import datetime
+
+import clique
+import pytest
+
+import riffle.core
+import riffle.mount
+
+
+def entry(path, kind=riffle.core.FILE, size=0, modified=0.0):
+    '''Return :py:class:`riffle.core.Entry` for *path*.'''
+    return riffle.core.Entry(path, kind, size, modified)
+
+
+def assemble(paths, minimumItems=2):
+    '''Return collections and remainder assembled from *paths*.
+
+    Collections are returned as a dictionary of format to indexes and the
+    remainder as a set of paths, matching the form returned by
+    :py:func:`clique.assemble` for comparison.
+
+    '''
+    assembler = riffle.core.CollectionAssembler(minimumItems=minimumItems)
+    remainder = set()
+
+    for path in paths:
+        if not assembler.add(entry(path)):
+            remainder.add(path)
+
+    collections, assembled = assembler.assemble()
+    remainder.update(path for path, _ in assembled)
+
+    return (
+        dict(
+            (collection.format(), collection.indexes)
+            for collection, _ in collections
+        ),
+        remainder
+    )
+
+
+def cliqueAssemble(paths, minimumItems=2):
+    '''Return collections and remainder assembled from *paths* by clique.'''
+    collections, remainder = clique.assemble(
+        paths, patterns=[riffle.core.FRAMES_PATTERN],
+        minimum_items=minimumItems
+    )
+
+    return (
+        dict(
+            (collection.format(), collection.indexes)
+            for collection in collections
+        ),
+        set(remainder)
+    )
+
+
+def randomPaths(seed):
+    '''Return list of random paths for collection assembly.'''
+    generator = random.Random(seed)
+    paths = set()
+
+    for _ in range(generator.randint(1, 50)):
+        head = '/render/{0}.'.format(generator.choice(['a', 'b', 'c']))
+        tail = generator.choice(['.exr', '.dpx', ''])
+        padding = generator.choice([0, 0, 3, 4])
+        index = generator.randint(0, 1500)
+        paths.add('{0}{1:0{2}d}{3}'.format(head, index, padding, tail))
+
+    paths.add('/render/notes.txt')
+    paths = sorted(paths)
+    generator.shuffle(paths)
+
+    return paths
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_assembler_matches_clique(seed):
+    '''Assemble the same collections and remainder as clique.'''
+    paths = randomPaths(seed)
+    assert assemble(paths) == cliqueAssemble(paths)
+
+
+@pytest.mark.parametrize('paths', [
+    ['/render/a.0999.exr', '/render/a.1000.exr', '/render/a.1001.exr'],
+    ['/render/a.0001.exr', '/render/a.1000.exr', '/render/a.12345.exr'],
+    ['/render/a.1000.exr', '/render/a.1001.exr'],
+    ['/render/a.1.exr', '/render/a.2.exr', '/render/a.0003.exr'],
+    ['/render/a.001.exr', '/render/a.1000.exr', '/render/a.1001.exr']
+], ids=[
+    'padded and unpadded',
+    'partially merged',
+    'unpadded only',
+    'unmerged single padded',
+    'differing padding'
+])
+def test_assembler_merges_unpadded(paths):
+    '''Merge unpadded indexes into aligned padded collections like clique.'''
+    assert assemble(paths) == cliqueAssemble(paths)
+
+
+@pytest.mark.parametrize('minimumItems', [1, 2, 3])
+def test_assembler_minimum_items(minimumItems):
+    '''Respect minimum number of items like clique.'''
+    paths = [
+        '/render/a.0001.exr', '/render/a.0002.exr', '/render/b.0001.exr',
+        '/render/c.0001.exr', '/render/c.0002.exr', '/render/c.0003.exr'
+    ]
+    assert (
+        assemble(paths, minimumItems) == cliqueAssemble(paths, minimumItems)
+    )
+
+
+def test_assembler_is_emptied():
+    '''Empty assembler when assembled.'''
+    assembler = riffle.core.CollectionAssembler()
+    assembler.add(entry('/render/a.0001.exr'))
+    assembler.add(entry('/render/a.0002.exr'))
+
+    collections, _ = assembler.assemble()
+    assert len(collections) == 1
+
+    assert assembler.assemble() == ([], [])
+
+
+def test_assembler_remainder_entries():
+    '''Return retained entries with remainder.'''
+    assembler = riffle.core.CollectionAssembler()
+    single = entry('/render/a.0001.exr', size=10, modified=5.0)
+    assembler.add(single)
+
+    collections, remainder = assembler.assemble()
+    assert collections == []
+    assert remainder == [(single.path, single)]
+
+
+def test_collection_members_alignment():
+    '''Align members with sorted indexes of merged collection.'''
+    entries = [
+        entry('/render/a.1002.exr', size=2, modified=20.0),
+        entry('/render/a.0999.exr', riffle.core.DIRECTORY, 1, 10.0),
+        entry('/render/a.1000.exr', size=3, modified=30.0),
+        entry('/render/a.1001.exr', riffle.core.MOUNT, 4, 40.0)
+    ]
+
+    assembler = riffle.core.CollectionAssembler()
+    for item in entries:
+        assert assembler.add(item)
+
+    collections, remainder = assembler.assemble()
+    assert remainder == []
+    assert len(collections) == 1
+
+    collection, members = collections[0]
+    assert collection.format() == '/render/a.%04d.exr [999-1002]'
+    assert list(members.indexes) == sorted(collection.indexes)
+
+    codes = riffle.core._KIND_CODES
+    assert list(members.kinds) == [
+        codes[riffle.core.DIRECTORY], codes[riffle.core.FILE],
+        codes[riffle.core.MOUNT], codes[riffle.core.FILE]
+    ]
+    assert list(members.sizes) == [1, 3, 4, 2]
+    assert list(members.modified) == [10.0, 30.0, 40.0, 20.0]
+
+
+@pytest.mark.parametrize('typecode', ['l', riffle.core._INTEGER_TYPECODE])
+def test_collection_members_typecode(monkeypatch, typecode):
+    '''Assemble members using integer arrays available on Python 2.'''
+    monkeypatch.setattr(riffle.core, '_INTEGER_TYPECODE', typecode)
+
+    assembler = riffle.core.CollectionAssembler()
+    for index in (1, 2):
+        assembler.add(
+            entry('/render/a.{0:04d}.exr'.format(index), size=2 ** 30 + index)
+        )
+
+    (collection, members), = assembler.assemble()[0]
+    assert members.indexes.typecode == typecode
+    assert members.sizes.typecode == typecode
+    assert list(members.indexes) == [1, 2]
+    assert list(members.sizes) == [2 ** 30 + 1, 2 ** 30 + 2]
+
+
+def test_collection_listed_entries():
+    '''Rebuild member entries from collection members.'''
+    entries = [
+        entry('/render/a.{0:04d}.exr'.format(index), size=index,
+              modified=float(index))
+        for index in (3, 1, 2)
+    ]
+
+    items = list(riffle.core.iterItems(entries))
+    assert len(items) == 1
+
+    collection = items[0]
+    assert isinstance(collection, riffle.core.Collection)
+    assert collection.listedEntries() == sorted(entries)
+    assert collection.aggregate == riffle.core.Aggregate(6, 3, 3.0)
+
+    children = collection.fetchChildren()
+    assert [child.path for child in children] == [
+        item.path for item in sorted(entries)
+    ]
+    assert [child.size for child in children] == [1, 2, 3]
+
+
+def parent(count):
+    '''Return directory item with *count* file children.'''
+    item = riffle.core.Directory('/render')
+    for index in range(count):
+        item.addChild(
+            riffle.core.File(
+                '/render/{0}.txt'.format(index), riffle.core.Stat(0, 0.0)
+            )
+        )
+
+    return item
+
+
+def assertConsistent(item):
+    '''Assert rows and name index of children of *item* are consistent.'''
+    for row, child in enumerate(item.children):
+        assert child.parent is item
+        assert child.row == row
+        assert item.findChild(child.name) is child
+
+    assert len(item._childrenByName) == len(item.children)
+
+
+@pytest.mark.parametrize(('start', 'end'), [
+    (0, 0), (0, 4), (3, 5), (9, 9), (0, 9)
+])
+def test_remove_children(start, end):
+    '''Maintain rows and name index when removing children.'''
+    item = parent(10)
+
+    # Build index before removal so that it must be maintained.
+    assert item.findChild('0.txt') is item.children[0]
+
+    expected = item.children[start:end + 1]
+    removed = item.removeChildren(start, end)
+    assert removed == expected
+
+    for child in removed:
+        assert child.parent is None
+        assert child.row == 0
+        assert item.findChild(child.name) is None
+
+    assert len(item.children) == 10 - len(removed)
+    assertConsistent(item)
+
+
+def test_remove_child():
+    '''Maintain rows and name index when removing single child.'''
+    item = parent(5)
+    assert item.findChild('0.txt') is item.children[0]
+
+    child = item.children[2]
+    item.removeChild(child)
+    assert child.parent is None
+    assert [other.name for other in item.children] == [
+        '0.txt', '1.txt', '3.txt', '4.txt'
+    ]
+    assertConsistent(item)
+
+    with pytest.raises(ValueError):
+        item.removeChild(child)
+
+
+def test_add_after_remove_children():
+    '''Maintain rows and name index when adding after removing children.'''
+    item = parent(5)
+    assert item.findChild('0.txt') is item.children[0]
+
+    removed = item.removeChildren(1, 2)
+    item.addChild(removed[1])
+    item.addChild(riffle.core.File('/render/5.txt', riffle.core.Stat(0, 0.0)))
+
+    assert [other.name for other in item.children] == [
+        '0.txt', '3.txt', '4.txt', '2.txt', '5.txt'
+    ]
+    assertConsistent(item)
+
+
+def test_reparent_child():
+    '''Remove child from previous parent when added to another.'''
+    first = parent(3)
+    second = riffle.core.Directory('/other')
+    assert first.findChild('1.txt') is first.children[1]
+
+    child = first.children[1]
+    second.addChild(child)
+
+    assert child.parent is second
+    assert first.findChild('1.txt') is None
+    assertConsistent(first)
+    assertConsistent(second)
+
+
+@pytest.fixture()
+def items():
+    '''Return items of each type with listed stat information.'''
+    collection, = riffle.core.iterItems([
+        entry('/render/a.{0:04d}.exr'.format(index), size=100,
+              modified=float(index))
+        for index in (1, 2, 3)
+    ])
+
+    directory = riffle.core.Directory(
+        '/render/shots', riffle.core.Stat(4096, 50.0)
+    )
+    directory.aggregate = riffle.core.Aggregate(5000, 2, 60.0)
+
+    return [
+        riffle.core.File('/render/notes.txt', riffle.core.Stat(10, 10.0)),
+        riffle.core.File('/render/big.mov', riffle.core.Stat(1000, 20.0)),
+        riffle.core.File('/render/unknown.txt'),
+        riffle.core.Directory('/render/plates', riffle.core.Stat(4096, 30.0)),
+        directory,
+        riffle.core.Mount(
+            '/mnt/data', riffle.core.Stat(0, 40.0),
+            capacity=riffle.mount.Capacity(10000, 500)
+        ),
+        collection
+    ]
+
+
+def accepted(filter, items):
+    '''Return names of *items* accepted by *filter*.
+
+    Also check that evaluating the items in one pass agrees with testing
+    each item in turn.
+
+    '''
+    flags = filter.evaluate(items)
+    assert list(flags) == [int(filter(item)) for item in items]
+
+    return [item.name for item, flag in zip(items, flags) if flag]
+
+
+def test_filter_empty(items):
+    '''Accept all items without criteria.'''
+    filter = riffle.core.Filter()
+    assert filter.isEmpty()
+    assert accepted(filter, items) == [item.name for item in items]
+
+
+@pytest.mark.parametrize(('size', 'expected'), [
+    ((10, 10), ['notes.txt']),
+    ((11, 1000), ['big.mov', 'a.%04d.exr [1-3]']),
+    ((None, 300), ['notes.txt', 'a.%04d.exr [1-3]']),
+    ((4096, None), ['plates', 'shots', 'data']),
+    ((5001, 9999), [])
+], ids=[
+    'exact', 'inclusive', 'no minimum', 'no maximum', 'none'
+])
+def test_filter_size(items, size, expected):
+    '''Accept items with known size within range.'''
+    filter = riffle.core.Filter(size=size)
+    assert not filter.isEmpty()
+    assert accepted(filter, items) == expected
+
+
+@pytest.mark.parametrize(('modified', 'expected'), [
+    ((10.0, 20.0), ['notes.txt', 'big.mov']),
+    ((None, 3.0), ['a.%04d.exr [1-3]']),
+    ((35.0, None), ['shots']),
+    (
+        (
+            datetime.datetime.fromtimestamp(30.0),
+            datetime.datetime.fromtimestamp(30.0)
+        ),
+        ['plates']
+    )
+], ids=[
+    'inclusive', 'no minimum', 'no maximum', 'datetime'
+])
+def test_filter_modified(items, modified, expected):
+    '''Accept items with known modification time within range.'''
+    filter = riffle.core.Filter(modified=modified)
+    assert accepted(filter, items) == expected
+
+
+def test_filter_does_not_query_filesystem(items):
+    '''Reject items without listed stat information for range criteria.'''
+    unknown = items[2]
+    filter = riffle.core.Filter(size=(None, None), modified=(None, None))
+
+    assert not filter(unknown)
+    assert unknown._modified is None
+
+
+@pytest.mark.parametrize(('types', 'expected'), [
+    (['File'], ['notes.txt', 'big.mov', 'unknown.txt']),
+    (['Directory', 'Mount'], ['plates', 'shots', 'data']),
+    (['Collection'], ['a.%04d.exr [1-3]']),
+    ([], [])
+], ids=[
+    'file', 'multiple', 'collection', 'none'
+])
+def test_filter_types(items, types, expected):
+    '''Accept items of given types.'''
+    filter = riffle.core.Filter(types=types)
+    assert accepted(filter, items) == expected
+
+
+@pytest.mark.parametrize(('criteria', 'expected'), [
+    ({'pattern': '*.TXT'}, ['notes.txt', 'unknown.txt']),
+    ({'pattern': '*.TXT', 'caseSensitive': True}, []),
+    ({'pattern': 'a.%04d.exr'}, ['a.%04d.exr [1-3]']),
+    ({'pattern': 'a.*[[]1-3[]]'}, ['a.%04d.exr [1-3]']),
+    ({'pattern': '*.exr'}, ['a.%04d.exr [1-3]']),
+    ({'regex': 'o'}, ['notes.txt', 'big.mov', 'unknown.txt', 'shots']),
+    ({'regex': r'%04d\.exr$'}, ['a.%04d.exr [1-3]']),
+    ({'pattern': '*.txt', 'regex': '^n'}, ['notes.txt'])
+], ids=[
+    'pattern', 'case sensitive', 'collection pattern', 'collection name',
+    'collection pattern wildcard', 'regex', 'collection regex', 'combined'
+])
+def test_filter_name(items, criteria, expected):
+    '''Accept items by name or collection pattern.'''
+    filter = riffle.core.Filter(**criteria)
+    assert accepted(filter, items) == expected
+
+
+def test_filter_evaluate_names(items):
+    '''Use names given to evaluate in place of item names.'''
+    filter = riffle.core.Filter(pattern='*.txt')
+    names = ['{0}.txt'.format(index) for index in range(len(items))]
+
+    assert list(filter.evaluate(items, names)) == [1] * len(items)
+
+
+def test_filter_combined(items):
+    '''Accept items matching all criteria.'''
+    filter = riffle.core.Filter(
+        pattern='*.txt', types=['File'], size=(None, 100)
+    )
+    assert accepted(filter, items) == ['notes.txt']
+
+
+def test_mount_of_file(tmpdir):
+    '''Return no children for a mount of a single file.'''
+    path = tmpdir.join('hostname')
+    path.write('host')
+
+    item = riffle.core.Mount(str(path))
+    assert item.fetchChildren(10) == []
+    assert not item.canFetchMore()
+
+
+def test_mount_listing_error(tmpdir):
+    '''Raise errors other than for a mount of a single file.'''
+    item = riffle.core.Mount(str(tmpdir.join('missing')))
+    with pytest.raises(OSError):
+        item.fetchChildren(10)
+
+
+class FailingDirectory(riffle.core.Directory):
+    '''Directory whose listing fails after a number of children.'''
+
+    __slots__ = ()
+
+    def _iterChildren(self):
+        '''Yield children then fail as if the directory was removed.'''
+        for index in range(5):
+            yield riffle.core.File('/render/{0}.txt'.format(index))
+
+        raise OSError('Directory removed.')
+
+
+def test_fetch_children_error():
+    '''Restart listing after error fetching children.'''
+    item = FailingDirectory('/render')
+
+    assert len(item.fetchChildren(3)) == 3
+    with pytest.raises(OSError):
+        item.fetchChildren(3)
+
+    assert item._childIterator is None
+    assert item.canFetchMore()
+
+    assert len(item.fetchChildren(3)) == 3
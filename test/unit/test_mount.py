@@ -0,0 +1,86 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import riffle.mount
+from riffle.mount import MountPoint
+
+
+MOUNT_INFO = '\n'.join([
+    '22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw',
+    '23 22 0:21 / /proc rw,nosuid - proc proc rw',
+    '24 22 8:2 / /mnt/my\\040disk rw,relatime - ext4 /dev/sdb\\0401 rw',
+    '25 22 0:40 / /mnt/tab\\011name rw - nfs server:/tab\\134name rw',
+    '26 22 8:3 / /data rw,relatime shared:2 master:1 - xfs /dev/sdc1 rw',
+    '27 26 0:50 / /data rw,relatime - nfs server:/data rw',
+    '28 22 8:4 / /short rw -',
+    'malformed line',
+    ''
+])
+
+
+def test_parse():
+    '''Parse mount points ordered by path.'''
+    mounts = riffle.mount.parseMountInfo(MOUNT_INFO)
+    assert [mount.path for mount in mounts] == sorted(
+        mount.path for mount in mounts
+    )
+    assert MountPoint('/', 'ext4', '/dev/sda1') in mounts
+    assert MountPoint('/proc', 'proc', 'proc') in mounts
+
+
+def test_parse_escaped_paths():
+    '''Decode octal escapes in mount points and sources.'''
+    mounts = riffle.mount.parseMountInfo(MOUNT_INFO)
+    assert MountPoint('/mnt/my disk', 'ext4', '/dev/sdb 1') in mounts
+    assert MountPoint('/mnt/tab\tname', 'nfs', 'server:/tab\\name') in mounts
+
+
+def test_parse_over_mount():
+    '''Return only the last filesystem mounted over a mount point.'''
+    mounts = riffle.mount.parseMountInfo(MOUNT_INFO)
+    data = [mount for mount in mounts if mount.path == '/data']
+    assert data == [MountPoint('/data', 'nfs', 'server:/data')]
+
+
+def test_parse_skips_malformed():
+    '''Skip lines without required fields.'''
+    mounts = riffle.mount.parseMountInfo(MOUNT_INFO)
+    assert '/short' not in [mount.path for mount in mounts]
+    assert len(mounts) == 5
+
+
+@pytest.fixture()
+def mountInfo(tmpdir):
+    '''Return path to temporary mount table.'''
+    path = tmpdir.join('mountinfo')
+    path.write(MOUNT_INFO)
+    return str(path)
+
+
+def test_table(mountInfo):
+    '''Look up mount points from table.'''
+    table = riffle.mount.MountTable(mountInfo, checkInterval=0)
+    assert table.isAvailable()
+
+    assert table.isMount('/mnt/my disk')
+    assert not table.isMount('/mnt')
+    assert '/data' in table.paths()
+
+    assert table.mount('/data/shots/a.exr').type == 'nfs'
+    assert table.mount('/mnt/my disk').source == '/dev/sdb 1'
+    assert table.mount('/mnt/my diskette').path == '/'
+
+    table.close()
+    assert not table.isAvailable()
+
+
+def test_table_unavailable(tmpdir):
+    '''Return empty table when mount table cannot be read.'''
+    table = riffle.mount.MountTable(str(tmpdir.join('missing')))
+    assert not table.isAvailable()
+    assert table.mounts() == []
+    assert table.mount('/data') is None
+    assert not table.refresh(force=True)